@@ -27,4 +27,155 @@ class Settings:
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
     REFRESH_TOKEN_EXPIRE_DAYS: int = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS"))
 
+    # Логирование запросов: сколько байт тела писать в лог и сколько ошибок держать в памяти
+    REQUEST_LOG_BODY_LIMIT: int = int(os.getenv("REQUEST_LOG_BODY_LIMIT", 4096))
+    REQUEST_LOG_HISTORY_SIZE: int = int(os.getenv("REQUEST_LOG_HISTORY_SIZE", 100))
+
+    # Формат логов (json или text) и доля INFO-записей по логгерам: "app.access=0.1"
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "json")
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_SAMPLE_RATES: str = os.getenv("LOG_SAMPLE_RATES", "")
+
+    # Bearer-токен скрапера для /metrics (кроме него пускается только администратор)
+    METRICS_TOKEN: str = os.getenv("METRICS_TOKEN", "")
+    # Метрики /metrics, период замера задержки event loop и порог, после которого снимается стек (секунды).
+    # Период не больше половины порога - большее значение понижается с предупреждением в лог
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    LOOP_LAG_INTERVAL: float = float(os.getenv("LOOP_LAG_INTERVAL", 0.05))
+    LOOP_BLOCK_THRESHOLD: float = float(os.getenv("LOOP_BLOCK_THRESHOLD", 0.1))
+
+    # Медленные запросы: порог, размер хранилища, EXPLAIN (ANALYZE, BUFFERS) для чтения (для блокирующих
+    # и меняющих данные - EXPLAIN без выполнения) и как часто его повторять
+    SLOW_QUERY_THRESHOLD_MS: float = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", 200))
+    SLOW_QUERY_MAX_ENTRIES: int = int(os.getenv("SLOW_QUERY_MAX_ENTRIES", 50))
+    SLOW_QUERY_EXPLAIN: bool = os.getenv("SLOW_QUERY_EXPLAIN", "false").lower() == "true"
+    SLOW_QUERY_EXPLAIN_INTERVAL: int = int(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL", 600))
+
+    # Профилирование: каталог файлов, сколько хранить, период сэмплирования запроса и непрерывного режима
+    PROFILE_DIR: str = os.getenv("PROFILE_DIR", str(BASE_DIR / "profiles"))
+    PROFILE_MAX_FILES: int = int(os.getenv("PROFILE_MAX_FILES", 50))
+    PROFILE_REQUEST_INTERVAL: float = float(os.getenv("PROFILE_REQUEST_INTERVAL", 0.005))
+    PROFILE_CONTINUOUS_INTERVAL: float = float(os.getenv("PROFILE_CONTINUOUS_INTERVAL", 0.02))
+
+    # Идемпотентность запроса реквизитов по transaction_id
+    REQUISITES_IDEMPOTENCY_TTL: int = int(os.getenv("REQUISITES_IDEMPOTENCY_TTL", 900))
+    REQUISITES_IDEMPOTENCY_MAX_KEYS: int = int(os.getenv("REQUISITES_IDEMPOTENCY_MAX_KEYS", 10000))
+
+    # Пул для bcrypt: размер и лимит ожидающих задач
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+    PASSWORD_HASH_MAX_PENDING: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 32))
+
+    # Кэш аутентифицированных пользователей (по хешу токена)
+    PRINCIPAL_CACHE_TTL: int = int(os.getenv("PRINCIPAL_CACHE_TTL", 60))
+    PRINCIPAL_CACHE_MAX_SIZE: int = int(os.getenv("PRINCIPAL_CACHE_MAX_SIZE", 10000))
+
+    # Роли и версия токена внутри access-токена (авторизация без запроса в БД)
+    ACCESS_TOKEN_ROLE_CLAIMS: bool = os.getenv("ACCESS_TOKEN_ROLE_CLAIMS", "false").lower() == "true"
+    TOKEN_VERSION_CACHE_TTL: int = int(os.getenv("TOKEN_VERSION_CACHE_TTL", 30))
+
+    # Доверенные прокси: только от них читается X-Forwarded-For (utils/client_ip.py).
+    # Приложение слушает 127.0.0.2 (Dockerfile), поэтому по умолчанию доверяем loopback
+    TRUSTED_PROXIES: str = os.getenv("TRUSTED_PROXIES", "127.0.0.0/8,::1")
+
+    # Лимит попыток входа: memory - в памяти воркера, postgres - общий для всех воркеров
+    AUTH_RATE_LIMIT_BACKEND: str = os.getenv("AUTH_RATE_LIMIT_BACKEND", "memory")
+    LOGIN_RATE_IP_BURST: int = int(os.getenv("LOGIN_RATE_IP_BURST", 20))
+    LOGIN_RATE_IP_PER_MINUTE: int = int(os.getenv("LOGIN_RATE_IP_PER_MINUTE", 10))
+    LOGIN_RATE_USER_BURST: int = int(os.getenv("LOGIN_RATE_USER_BURST", 5))
+    LOGIN_RATE_USER_PER_MINUTE: int = int(os.getenv("LOGIN_RATE_USER_PER_MINUTE", 5))
+
+    # Платёжные провайдеры. Не заданы - провайдер пропускается при выборе реквизитов (integrations/registry.py)
+    PAYBRIDGE_API_URL: str = os.getenv("PAYBRIDGE_API_URL")
+    PAYBRIDGE_MERCHANT_ID: str = os.getenv("PAYBRIDGE_MERCHANT_ID")
+    PAYBRIDGE_API_SECRET: str = os.getenv("PAYBRIDGE_API_SECRET")
+    PAYCHAINT_API_KEY: str = os.getenv("PAYCHAINT_API_KEY")
+    PAYCHAINT_API_URL: str = os.getenv("PAYCHAINT_API_URL", "https://api.paychain.fund/")
+    PLATI_PAYS_CALLBACK: str = os.getenv("PLATI_PAYS_CALLBACK")
+    PLATI_PAYS_KEY: str = os.getenv("PLATI_PAYS_KEY")
+    PLATI_PAYS_SECRET: str = os.getenv("PLATI_PAYS_SECRET")
+    PROFIAT_HOST: str = os.getenv("PROFIAT_HOST")
+    PROFIAT_UID: str = os.getenv("PROFIAT_UID")
+    PROFIAT_KEY: str = os.getenv("PROFIAT_KEY")
+    ONEPAYMENT_API_KEY_KZ: str = os.getenv("ONEPAYMENT_API_KEY_KZ")
+    ONEPAYMENT_HOOK_URL_KZ: str = os.getenv("ONEPAYMENT_HOOK_URL_KZ")
+    ONEPAYMENT_API_URL_KZ: str = os.getenv("ONEPAYMENT_API_URL_KZ")
+    PAYPORT_API3_KEY: str = os.getenv("PAYPORT_API3_KEY")
+    PAYPORT_API5_KEY: str = os.getenv("PAYPORT_API5_KEY")
+    PAYPORT_API_URL: str = os.getenv("PAYPORT_API_URL")
+    PAYPORT_HOOK_URL: str = os.getenv("PAYPORT_HOOK_URL")
+    PAYPLAY_API_KEY: str = os.getenv("PAYPLAY_API_KEY")
+    SETTLEMENT_API_URL: str = os.getenv("SETTLEMENT_API_URL", "https://billing1.klubok-kz.com")
+    SETTLEMENT_AUTH_TOKEN: str = os.getenv("SETTLEMENT_AUTH_TOKEN", "")
+
+    # Синхронизация статусов с settlement: окно склейки (секунды), параллельных запросов, соединений в пуле
+    SETTLEMENT_SYNC_WINDOW: float = float(os.getenv("SETTLEMENT_SYNC_WINDOW", 0.2))
+    SETTLEMENT_SYNC_CONCURRENCY: int = int(os.getenv("SETTLEMENT_SYNC_CONCURRENCY", 8))
+    SETTLEMENT_SYNC_MAX_CONNECTIONS: int = int(os.getenv("SETTLEMENT_SYNC_MAX_CONNECTIONS", 20))
+
+    # Outbox внешних вызовов: включение (после миграции outbox), воркеры, пачка, опрос, попыток до dead,
+    # задержка повтора (база и потолок), вызовов на endpoint, аренда захваченной пачки (секунды, больше времени вызовов)
+    OUTBOX_ENABLED: bool = os.getenv("OUTBOX_ENABLED", "false").lower() == "true"
+    OUTBOX_WORKERS: int = int(os.getenv("OUTBOX_WORKERS", 2))
+    OUTBOX_BATCH_SIZE: int = int(os.getenv("OUTBOX_BATCH_SIZE", 20))
+    OUTBOX_POLL_INTERVAL: float = float(os.getenv("OUTBOX_POLL_INTERVAL", 1.0))
+    OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 8))
+    OUTBOX_RETRY_DELAY: float = float(os.getenv("OUTBOX_RETRY_DELAY", 2.0))
+    OUTBOX_MAX_RETRY_DELAY: float = float(os.getenv("OUTBOX_MAX_RETRY_DELAY", 600))
+    OUTBOX_CONCURRENCY: int = int(os.getenv("OUTBOX_CONCURRENCY", 4))
+    OUTBOX_LEASE: float = float(os.getenv("OUTBOX_LEASE", 300))
+
+    # Пересылка чеков провайдерам: одновременных загрузок на провайдера, соединений в пуле, таймаут (секунды)
+    RECEIPT_UPLOAD_CONCURRENCY: int = int(os.getenv("RECEIPT_UPLOAD_CONCURRENCY", 4))
+    RECEIPT_HTTP_MAX_CONNECTIONS: int = int(os.getenv("RECEIPT_HTTP_MAX_CONNECTIONS", 20))
+    RECEIPT_UPLOAD_TIMEOUT: float = float(os.getenv("RECEIPT_UPLOAD_TIMEOUT", 60))
+    # Закрытый каталог для чеков (не раздаётся через /uploads) и срок хранения неотправленных (секунды)
+    RECEIPT_SPOOL_DIR: str = os.getenv("RECEIPT_SPOOL_DIR", str(BASE_DIR / "receipt_spool"))
+    RECEIPT_SPOOL_TTL: int = int(os.getenv("RECEIPT_SPOOL_TTL", 24 * 3600))
+
+    # Нормализация фото чеков (нужен Pillow): размер по большей стороне, качество JPEG, процессов в пуле
+    RECEIPT_NORMALIZE: bool = os.getenv("RECEIPT_NORMALIZE", "true").lower() == "true"
+    RECEIPT_MAX_SIDE: int = int(os.getenv("RECEIPT_MAX_SIDE", 1600))
+    RECEIPT_JPEG_QUALITY: int = int(os.getenv("RECEIPT_JPEG_QUALITY", 80))
+    RECEIPT_NORMALIZE_WORKERS: int = int(os.getenv("RECEIPT_NORMALIZE_WORKERS", 2))
+
+    # Обработка колбэков провайдеров: включение (после миграции webhook_events), воркеров в процессе,
+    # пачка, период опроса очереди, попыток до failed
+    WEBHOOK_WORKERS_ENABLED: bool = os.getenv("WEBHOOK_WORKERS_ENABLED", "false").lower() == "true"
+    WEBHOOK_WORKERS: int = int(os.getenv("WEBHOOK_WORKERS", 2))
+    WEBHOOK_BATCH_SIZE: int = int(os.getenv("WEBHOOK_BATCH_SIZE", 20))
+    WEBHOOK_POLL_INTERVAL: float = float(os.getenv("WEBHOOK_POLL_INTERVAL", 1.0))
+    WEBHOOK_MAX_ATTEMPTS: int = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", 5))
+    # Недавние ключи (провайдер, платёж, статус) в памяти - дубликаты отсекаются без запроса в БД
+    WEBHOOK_DEDUP_CACHE_SIZE: int = int(os.getenv("WEBHOOK_DEDUP_CACHE_SIZE", 10000))
+    WEBHOOK_DEDUP_CACHE_TTL: int = int(os.getenv("WEBHOOK_DEDUP_CACHE_TTL", 3600))
+    # Проверка отправителя колбэка по провайдерам. Секрет "payport=s1,paychain=s2": HMAC-SHA256/SHA512 тела
+    # в заголовке X-Signature (Signature) или сам секрет в X-Webhook-Token / ?token=.
+    # IP "payport=1.2.3.4|10.0.0.0/24" - адрес клиента за прокси из TRUSTED_PROXIES. Без того и другого колбэки отклоняются
+    WEBHOOK_SECRETS: str = os.getenv("WEBHOOK_SECRETS", "")
+    WEBHOOK_ALLOWED_IPS: str = os.getenv("WEBHOOK_ALLOWED_IPS", "")
+
+    # Опрос статусов ордеров: включение (после миграции webhook_events), "возраст:интервал" в секундах, тик колеса,
+    # бюджет запросов на провайдера, таймаут одного запроса и предел страниц истории инвойсов за одну проверку
+    STATUS_POLLER_ENABLED: bool = os.getenv("STATUS_POLLER_ENABLED", "false").lower() == "true"
+    STATUS_POLL_SCHEDULE: str = os.getenv("STATUS_POLL_SCHEDULE", "300:15,1800:60,7200:300,86400:1800")
+    STATUS_POLL_TICK: float = float(os.getenv("STATUS_POLL_TICK", 1.0))
+    STATUS_POLL_RATE: float = float(os.getenv("STATUS_POLL_RATE", 2.0))
+    STATUS_POLL_BURST: float = float(os.getenv("STATUS_POLL_BURST", 5.0))
+    STATUS_POLL_TIMEOUT: float = float(os.getenv("STATUS_POLL_TIMEOUT", 10.0))
+    STATUS_POLL_MAX_PAGES: int = int(os.getenv("STATUS_POLL_MAX_PAGES", 20))
+
+    # Листинг бонусов /api/v1/client-bonus: подключение роутера (по умолчанию выключен, как раньше)
+    # и сколько секунд кэшируется количество бонусов для каждого фильтра
+    BONUS_ROUTER_ENABLED: bool = os.getenv("BONUS_ROUTER_ENABLED", "false").lower() == "true"
+    BONUS_COUNT_CACHE_TTL: int = int(os.getenv("BONUS_COUNT_CACHE_TTL", 30))
+
+    # Бюджет времени импорта main (python -m utils.import_budget)
+    IMPORT_BUDGET_MS: int = int(os.getenv("IMPORT_BUDGET_MS", 2000))
+
+    # Курсы валют к USD
+    FX_RATES_URL: str = os.getenv("FX_RATES_URL")
+    FX_RATES_CURRENCIES: list = os.getenv("FX_RATES_CURRENCIES", "KZT,UAH,RUB").split(",")
+    FX_RATES_REFRESH_INTERVAL: int = int(os.getenv("FX_RATES_REFRESH_INTERVAL", 300))
+    FX_RATES_MAX_AGE: int = int(os.getenv("FX_RATES_MAX_AGE", 1800))
+
 settings = Settings()
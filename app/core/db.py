@@ -1,13 +1,44 @@
+import time
+
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from core.config import settings
+from utils.metrics import registry
+from utils.slow_queries import slow_query_log
+
+pool_wait_seconds = registry.histogram(
+    "db_pool_wait_seconds", "Ожидание соединения из пула SQLAlchemy",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    '''Пул с замером времени получения соединения (включая ожидание при исчерпании пула)'''
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_wait_seconds.observe(time.perf_counter() - start)
+
 
 # Создание асинхронного движка SQLAlchemy
 engine = create_async_engine(
     settings.DB_URL,
     echo=False,  # Для логирования SQL-запросов
+    poolclass=InstrumentedQueuePool,
 )
 
+# Состояние пула считается в момент выдачи /metrics
+registry.gauge("db_pool_checked_out", "Соединения, выданные из пула").set_function(engine.pool.checkedout)
+registry.gauge("db_pool_size", "Размер пула").set_function(engine.pool.size)
+registry.gauge("db_pool_overflow", "Соединения сверх размера пула").set_function(engine.pool.overflow)
+
+# Запись медленных запросов (SLOW_QUERY_THRESHOLD_MS)
+slow_query_log.install(engine)
+
 # Создание фабрики сессий
 async_session = sessionmaker(
     bind=engine,
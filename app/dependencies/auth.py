@@ -1,3 +1,7 @@
+import asyncio
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional, Union
 
@@ -6,11 +10,14 @@ from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import or_, update
 from sqlalchemy.future import select
 
 from core.config import settings
-from core.db import get_session
+from core.db import get_session, async_session
 from models.UserModel import UserModel
+from schemas.auth import Principal
+from utils.cache import TTLCache
 
 # Настройка для хеширования паролей
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -18,6 +25,22 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 # Настройка OAuth2 с endpoint для получения токена
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/v1/auth/token")
 
+# Кэш sha256(token) -> Principal, чтобы не ходить в БД на каждый защищённый запрос
+principal_cache = TTLCache(maxsize=settings.PRINCIPAL_CACHE_MAX_SIZE, ttl=settings.PRINCIPAL_CACHE_TTL)
+
+# Кэш user_id -> token_version для проверки токенов с ролями
+token_version_cache = TTLCache(maxsize=settings.PRINCIPAL_CACHE_MAX_SIZE, ttl=settings.TOKEN_VERSION_CACHE_TTL)
+
+# Ролевые флаги пользователя
+ROLE_FLAGS = ("is_admin", "is_client", "is_operator", "is_cashier")
+
+# Отдельный пул под bcrypt: хеширование не занимает event loop (bcrypt отпускает GIL)
+password_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="bcrypt"
+)
+_password_tasks_pending = 0
+
 # Функция для верификации пароля
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -26,6 +49,29 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+# Запуск bcrypt в пуле с ограничением очереди: при всплеске логинов лишние запросы
+# сразу получают 503, а не копятся и не отнимают CPU у платежных эндпоинтов
+async def _run_password_task(func, *args):
+    global _password_tasks_pending
+    if _password_tasks_pending >= settings.PASSWORD_HASH_MAX_PENDING:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Сервер перегружен, повторите попытку позже",
+            headers={"Retry-After": "1"},
+        )
+    _password_tasks_pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(password_executor, func, *args)
+    finally:
+        _password_tasks_pending -= 1
+
+async def verify_password_async(plain_password, hashed_password):
+    return await _run_password_task(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    return await _run_password_task(get_password_hash, password)
+
 # Функция для поиска пользователя по имени пользователя
 async def get_user_by_username(session: AsyncSession, username: str):
     result = await session.execute(
@@ -40,17 +86,42 @@ async def get_user_by_email(session: AsyncSession, email: str):
     )
     return result.scalars().first()
 
+# Колонки для access_token_claims. token_version нужна только токенам с ролями
+def token_claim_columns() -> tuple:
+    columns = (
+        UserModel.id,
+        UserModel.username,
+        UserModel.is_admin,
+        UserModel.is_client,
+        UserModel.is_operator,
+        UserModel.is_cashier,
+    )
+    if settings.ACCESS_TOKEN_ROLE_CLAIMS:
+        columns += (UserModel.token_version,)
+    return columns
+
+# Отзыв выданных токенов с ролями. Без ACCESS_TOKEN_ROLE_CLAIMS роли в токене нет - отзывать нечего
+def revoke_user_tokens(db_user: UserModel) -> None:
+    if settings.ACCESS_TOKEN_ROLE_CLAIMS:
+        db_user.token_version = UserModel.token_version + 1
+
+# Данные для входа одним запросом: по username или email, только нужные колонки
+async def get_user_credentials(session: AsyncSession, login: str):
+    result = await session.execute(
+        select(*token_claim_columns(), UserModel.hashed_password)
+        .where(or_(UserModel.username == login, UserModel.email == login))
+        # Совпадение по username приоритетнее совпадения по email
+        .order_by((UserModel.username == login).desc())
+        .limit(1)
+    )
+    return result.first()
+
 # Функция аутентификации пользователя
 async def authenticate_user(session: AsyncSession, username: str, password: str):
-    # Сначала пробуем найти по username
-    user = await get_user_by_username(session, username)
-    
-    # Если не нашли, пробуем по email
-    if not user:
-        user = await get_user_by_email(session, username)
-    
-    # Если всё ещё не нашли или пароль неверный
-    if not user or not verify_password(password, user.hashed_password):
+    user = await get_user_credentials(session, username)
+
+    # Если не нашли или пароль неверный
+    if not user or not await verify_password_async(password, user.hashed_password):
         return False
         
     return user
@@ -66,13 +137,50 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-# Проверка текущего пользователя
-async def get_current_user(session: AsyncSession = Depends(get_session), token: str = Depends(oauth2_scheme)):
-    credentials_exception = HTTPException(
+# Данные для access-токена. С ACCESS_TOKEN_ROLE_CLAIMS в токен кладутся id, роли и версия
+def access_token_claims(user) -> dict:
+    data = {"sub": user.username}
+    if settings.ACCESS_TOKEN_ROLE_CLAIMS:
+        data.update({
+            "uid": user.id,
+            "roles": [flag for flag in ROLE_FLAGS if getattr(user, flag)],
+            "ver": user.token_version or 0,
+        })
+    return data
+
+# Сброс закэшированных сессий пользователя (после изменения или удаления)
+def invalidate_user_principals(user_id: int) -> None:
+    principal_cache.pop_where(lambda _, principal: principal.id == user_id)
+    token_version_cache.pop(user_id)
+
+# Текущая версия токенов пользователя; None если пользователя нет
+async def get_token_version(session: AsyncSession, user_id: int) -> Optional[int]:
+    version = token_version_cache.get(user_id)
+    if version is None:
+        result = await session.execute(
+            select(UserModel.token_version).where(UserModel.id == user_id)
+        )
+        version = result.scalar_one_or_none()
+        if version is None:
+            return None
+        token_version_cache.set(user_id, version)
+    return version
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+# Проверка текущего пользователя
+async def get_current_user(session: AsyncSession = Depends(get_session), token: str = Depends(oauth2_scheme)) -> Principal:
+    token_key = hashlib.sha256(token.encode()).hexdigest()
+    principal = principal_cache.get(token_key)
+    if principal is not None:
+        return principal
+
+    credentials_exception = _credentials_exception()
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         username: str = payload.get("sub")
@@ -84,10 +192,38 @@ async def get_current_user(session: AsyncSession = Depends(get_session), token:
     user = await get_user_by_username(session, username=username)
     if user is None:
         raise credentials_exception
-    return user
+
+    principal = Principal.model_validate(user)
+    # Запись не должна пережить сам токен
+    ttl = min(settings.PRINCIPAL_CACHE_TTL, payload["exp"] - time.time()) if payload.get("exp") else None
+    if ttl is None or ttl > 0:
+        principal_cache.set(token_key, principal, ttl=ttl)
+    return principal
+
+# Пользователь для проверки ролей. Токены с ролями проверяются по claims и версии
+# из кэша, без загрузки строки пользователя; старые токены идут через get_current_user
+async def get_authorized_user(session: AsyncSession = Depends(get_session), token: str = Depends(oauth2_scheme)) -> Principal:
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        raise _credentials_exception()
+
+    if "roles" not in payload or "ver" not in payload or "uid" not in payload:
+        return await get_current_user(session, token)
+
+    version = await get_token_version(session, payload["uid"])
+    if version is None or version != payload["ver"]:
+        raise _credentials_exception()
+
+    roles = set(payload["roles"])
+    return Principal(
+        id=payload["uid"],
+        username=payload["sub"],
+        **{flag: flag in roles for flag in ROLE_FLAGS}
+    )
 
 # Проверка прав администратора
-async def get_admin_user(current_user: UserModel = Depends(get_current_user)):
+async def get_admin_user(current_user: Principal = Depends(get_authorized_user)):
     if not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, 
@@ -95,8 +231,17 @@ async def get_admin_user(current_user: UserModel = Depends(get_current_user)):
         )
     return current_user
 
+# Проверка токена администратора вне Depends (middleware профилирования)
+async def is_admin_token(token: str) -> bool:
+    async with async_session() as session:
+        try:
+            principal = await get_authorized_user(session, token)
+        except HTTPException:
+            return False
+    return bool(principal.is_admin)
+
 # Проверка прав оператора
-async def get_operator_user(current_user: UserModel = Depends(get_current_user)):
+async def get_operator_user(current_user: Principal = Depends(get_authorized_user)):
     if not current_user.is_operator and not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, 
@@ -105,7 +250,7 @@ async def get_operator_user(current_user: UserModel = Depends(get_current_user))
     return current_user
 
 # Проверка прав кассира
-async def get_cashier_user(current_user: UserModel = Depends(get_current_user)):
+async def get_cashier_user(current_user: Principal = Depends(get_authorized_user)):
     if not current_user.is_cashier and not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, 
@@ -114,7 +259,7 @@ async def get_cashier_user(current_user: UserModel = Depends(get_current_user)):
     return current_user
 
 # Проверка прав клиента
-async def get_client_user(current_user: UserModel = Depends(get_current_user)):
+async def get_client_user(current_user: Principal = Depends(get_authorized_user)):
     if not current_user.is_client and not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, 
@@ -122,14 +267,17 @@ async def get_client_user(current_user: UserModel = Depends(get_current_user)):
         )
     return current_user
 
-# Обновление токена доступа для пользователя
-async def update_user_token(session: AsyncSession, user: UserModel, token: str):
-    user.access_token = token
-    user.token_expires = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    session.add(user)
+# Обновление токена доступа для пользователя: один UPDATE без перечитывания строки
+async def update_user_token(session: AsyncSession, user_id: int, token: str):
+    await session.execute(
+        update(UserModel)
+        .where(UserModel.id == user_id)
+        .values(
+            access_token=token,
+            token_expires=datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+        )
+    )
     await session.commit()
-    await session.refresh(user)
-    return user
 
 # Создание токена обновления
 def create_refresh_token(data: dict):
@@ -0,0 +1,35 @@
+from fastapi import HTTPException, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from utils.client_ip import client_ip
+from utils.rate_limit import PostgresTokenBucketLimiter, TokenBucketLimiter
+
+
+def _make_limiter(burst: int, per_minute: int):
+    if settings.AUTH_RATE_LIMIT_BACKEND == "postgres":
+        return PostgresTokenBucketLimiter(capacity=burst, refill_per_second=per_minute / 60)
+    return TokenBucketLimiter(capacity=burst, refill_per_second=per_minute / 60)
+
+
+# Лимиты попыток входа по IP и по логину
+ip_limiter = _make_limiter(settings.LOGIN_RATE_IP_BURST, settings.LOGIN_RATE_IP_PER_MINUTE)
+username_limiter = _make_limiter(settings.LOGIN_RATE_USER_BURST, settings.LOGIN_RATE_USER_PER_MINUTE)
+
+
+# Проверка лимита до authenticate_user: лишние попытки отклоняются до хеширования пароля
+async def check_login_rate_limit(request: Request, username: str, session: AsyncSession):
+    # Реальный адрес клиента, а не прокси: иначе все клиенты делят одно ведро
+    ip = client_ip(request) or "unknown"
+    checks = (
+        (ip_limiter, f"ip:{ip}"),
+        (username_limiter, f"user:{username.strip().lower()}"),
+    )
+    for limiter, key in checks:
+        retry_after = await limiter.acquire(key, session)
+        if retry_after > 0:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Слишком много попыток входа, повторите позже",
+                headers={"Retry-After": str(int(retry_after) + 1)},
+            )
@@ -0,0 +1,31 @@
+import logging
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.WebhookEventModel import WebhookEventModel
+from utils.status_poller import status_poller
+from utils.webhooks import webhook_workers
+
+logger = logging.getLogger("app.webhooks")
+
+
+@webhook_workers.register("onepayment")
+async def _onepayment(session: AsyncSession, event: WebhookEventModel) -> None:
+    from integrations.onepayment.OnePaymentService import CallbackPayload
+
+    callback = CallbackPayload.model_validate(event.payload)
+    attributes = callback.data.attributes
+    logger.info(
+        "OnePayment %s %s (order %s): %s",
+        callback.data.type, attributes.uuid, attributes.external_order_id, attributes.payment_status,
+    )
+
+
+@webhook_workers.register("payport")
+async def _payport(session: AsyncSession, event: WebhookEventModel) -> None:
+    from integrations.registry import providers
+
+    providers.get("payport").handle_callback(event.payload)
+    if event.event_status in ("1", "-1"):
+        # Финальный статус пришёл колбэком - опрашивать инвойс больше не нужно
+        status_poller.untrack("payport", event.external_id)
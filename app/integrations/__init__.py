@@ -1,16 +1,16 @@
-from integrations.onepayment.OnePaymentService import OnePaymentsService, DepositSchema
-from integrations.payport.PayportService import PayportService, PaymentResponse, PaymentData
-from integrations.paybridge.PayBridgeService import PayBridgeService, PayBridgeDepositSchema
-from integrations.paychain.PayChainService import PayChainService
-from integrations.platipays.PlatiPaysService import PlatiPaysService
-from integrations.profita.ProfiatService import ProfiatService
+import logging
 
 from core.config import settings
+from integrations.registry import providers
+from utils.idempotency import RequestCoalescer
+from utils.fx_rates import fx_rates
+from utils.status_poller import status_poller
 from pydantic import BaseModel
 from fastapi import HTTPException
 from typing import Optional
 from enum import Enum
 
+logger = logging.getLogger("app.integrations")
 
 class PaymentProvider(Enum):
     """Платежные провайдеры и их ID в системе биллинга"""
@@ -37,29 +37,16 @@ class PaymentRequisitesSchema(BaseModel):
     billing_id: Optional[int] = None
 
 
-paybridge_service_ua = PayBridgeService(
-    api_url=settings.PAYBRIDGE_API_URL, 
-    merchant_id=settings.PAYBRIDGE_MERCHANT_ID, 
-    api_secret=settings.PAYBRIDGE_API_SECRET
-)
-
-paychain_service = PayChainService(settings.PAYCHAINT_API_KEY, settings.PAYCHAINT_API_URL)
-
-platipay_service = PlatiPaysService(callback_url=settings.PLATI_PAYS_CALLBACK, APIKEY=settings.PLATI_PAYS_KEY, secret_key=settings.PLATI_PAYS_SECRET) # TODO: TOD
-
-profiat_service = ProfiatService(
-    host=settings.PROFIAT_HOST,
-    kid=settings.PROFIAT_UID,
-    private_key_b64=settings.PROFIAT_KEY
-)
-
-onepayment_service_kz = OnePaymentsService(
-    api_key=settings.ONEPAYMENT_API_KEY_KZ,
-    hook_url=settings.ONEPAYMENT_HOOK_URL_KZ,
-    api_url=settings.ONEPAYMENT_API_URL_KZ
+# Повторный запрос реквизитов с тем же transaction_id и теми же параметрами не создаёт второй ордер у провайдера
+requisites_coalescer = RequestCoalescer(
+    ttl=settings.REQUISITES_IDEMPOTENCY_TTL,
+    maxsize=settings.REQUISITES_IDEMPOTENCY_MAX_KEYS
 )
 
 def get_requisites_from_onepayment_kzt(amount, currency, amo_id, transaction_id=None) -> tuple[str, str, str, int, int, int]:
+    from integrations.onepayment.OnePaymentService import DepositSchema
+
+    onepayment_service_kz = providers.get("onepayment_kz")
     data_payment = DepositSchema(
         payment_system="Kaspi Bank",
         national_currency_amount=amount,
@@ -80,19 +67,18 @@ def get_requisites_from_onepayment_kzt(amount, currency, amo_id, transaction_id=
     return billing_bank, card_to, card_to_details, 0, order_data.uuid, PaymentProvider.ONEPAYMENT_UA.billing_id
 
 def get_requisites_from_payport_ua(amount, currency, amo_id, transaction_id=None) -> tuple[str, str, str, int, int, int]:
-    payport_data = PayportService(
-        settings.PAYPORT_API3_KEY, 
-        settings.PAYPORT_API5_KEY,
-        settings.PAYPORT_API_URL,
-        settings.PAYPORT_HOOK_URL
-    ).make_order(
+    payport_data = providers.get("payport").make_order(
         amount=amount,
         currency=currency,
         client_customer_id=amo_id
     )
+    fx_rates.observe(currency, payport_data.rate, "payport")
+    status_poller.track("payport", payport_data.invoice_id)
     return payport_data.bank_name, payport_data.card_number, payport_data.card_holder, payport_data.invoice_id, payport_data.invoice_id, PaymentProvider.PAYPORT_UA.billing_id
 
 def get_requisites_from_paybridge(amount, currency, amo_id, transaction_id=None) -> tuple[str, str, str, int, str, int]:
+    from integrations.paybridge.PayBridgeService import PayBridgeDepositSchema
+
     deposit_data = PayBridgeDepositSchema(
         amount=amount,
         order_id=str(transaction_id),
@@ -100,7 +86,7 @@ def get_requisites_from_paybridge(amount, currency, amo_id, transaction_id=None)
         order_desc=f"Deposit{amount}{currency}by{amo_id}",
         version="1.0"
     )
-    order_data = paybridge_service_ua.create_payment(
+    order_data = providers.get("paybridge").create_payment(
         deposit_data
     )
 
@@ -108,31 +94,33 @@ def get_requisites_from_paybridge(amount, currency, amo_id, transaction_id=None)
 
 async def get_requisites_from_paychain(amount, currency, amo_id, transaction_id = None):
     try:
-        data_paychain = paychain_service.create_order(transaction_id, 0, amount)
+        data_paychain = providers.get("paychain").create_order(transaction_id, 0, amount)
 
         billing_bank = data_paychain["requisite"]["bank"]
         card_to = data_paychain["requisite"]["requisites"]
         card_to_details = data_paychain["requisite"]["ownerName"]
         billing_status = data_paychain["id"]
+        fx_rates.observe(currency, data_paychain.get("currencyRate"), "paychain")
         return billing_bank, card_to, card_to_details, 0, billing_status, PaymentProvider.PAYCHAIN.billing_id
     except Exception as e:
         raise HTTPException(status_code=402, detail=f"Payment Paychaint processing error: {str(e)}")
 
 async def get_requisites_from_platipay(amount, currency, amo_id, transaction_id = None):
     try:
-        data_platipay = platipay_service.create_order(amount, transaction_id, amo_id)
+        data_platipay = providers.get("platipay").create_order(amount, transaction_id, amo_id)
 
         billing_bank = data_platipay.bank
         card_to = data_platipay.card_number
         card_to_details = ""
         billing_status = data_platipay.bill_id
+        status_poller.track("platipay", billing_status)
         return billing_bank, card_to, card_to_details, 0, billing_status, PaymentProvider.PLATIPAY.billing_id
     except Exception as e:
         raise HTTPException(status_code=402, detail=f"Payment Paychaint processing error: {str(e)}")
 
 def get_requisites_from_profiat(amount, currency, amo_id, transaction_id):
     try:
-        data_profiat = profiat_service.create_order(amount, currency, amo_id, transaction_id)
+        data_profiat = providers.get("profiat").create_order(amount, currency, amo_id, transaction_id)
         billing_bank = data_profiat.payment.paymethod_description
         card_to = data_profiat.payment.card
         card_to_details = data_profiat.payment.name
@@ -141,6 +129,7 @@ def get_requisites_from_profiat(amount, currency, amo_id, transaction_id):
     except Exception as e:
         raise HTTPException(status_code=402, detail=f"Payment Paychaint processing error: {str(e)}")
 
+@requisites_coalescer.by_key("transaction_id", "amount", "currency", "amo_id")
 def get_requisites_from_payment_uah(amount, currency, amo_id, transaction_id = None) -> PaymentRequisitesSchema:
     '''Платежки которые участвуют: PayPort, Paybridge, paychain, PlatiPay, Profiat'''
     payment_methods = [
@@ -150,11 +139,12 @@ def get_requisites_from_payment_uah(amount, currency, amo_id, transaction_id = N
         ("PlatiPay", lambda: get_requisites_from_platipay(amount, currency, amo_id, transaction_id)),
         ("Profiat", lambda: get_requisites_from_profiat(amount, currency, amo_id, transaction_id)),
     ]
-
+    # Ни одна платежка может не ответить (или не быть настроена)
+    card_to = None
 
     for payment_name, payment_func in payment_methods:
         try:
-            print(f"Пробуем платежку: {payment_name}")
+            logger.info("Пробуем платежку: %s", payment_name)
             bank_name, card_number, card_holder, invoice_id, payment_id, payment_billing_id = payment_func()
             
             if bank_name and card_number and card_holder:
@@ -164,12 +154,12 @@ def get_requisites_from_payment_uah(amount, currency, amo_id, transaction_id = N
                 billing_order_id = invoice_id
                 billing_status = payment_id #  исторически так сложилось что в статусе лежит UUID
                 billing_id = payment_billing_id
-                print(f"Успешно получили реквизиты от {payment_name}")
+                logger.info("Успешно получили реквизиты от %s", payment_name)
                 break
             else:
-                print(f"Платежка {payment_name} вернула пустые реквизиты")
+                logger.warning("Платежка %s вернула пустые реквизиты", payment_name)
         except Exception as e:
-            print(f"Ошибка в платежке {payment_name}: {str(e)}")
+            logger.warning("Ошибка в платежке %s: %s", payment_name, e)
             continue
 
     if not card_to:
@@ -186,15 +176,17 @@ def get_requisites_from_payment_uah(amount, currency, amo_id, transaction_id = N
 
 
 #Метод возвращает реквизиты от платежки
+@requisites_coalescer.by_key("transaction_id", "amount", "currency", "amo_id")
 def get_requisites_from_payment_kzt(amount, currency, amo_id, transaction_id = None) -> PaymentRequisitesSchema:
     '''Платежки которые участвуют: PayPort, OnePayment'''
     payment_methods = [
         ("OnePayment", lambda: get_requisites_from_onepayment_kzt(amount, currency, amo_id, transaction_id)),
     ]
+    card_to = None
 
     for payment_name, payment_func in payment_methods:
         try:
-            print(f"Пробуем платежку: {payment_name}")
+            logger.info("Пробуем платежку: %s", payment_name)
             bank_name, card_number, card_holder, invoice_id, payment_id, payment_billing_id = payment_func()
             
             if bank_name and card_number and card_holder:
@@ -204,12 +196,12 @@ def get_requisites_from_payment_kzt(amount, currency, amo_id, transaction_id = N
                 billing_order_id = invoice_id
                 billing_status = payment_id #  исторически так сложилось что в статусе лежит UUID
                 billing_id = payment_billing_id
-                print(f"Успешно получили реквизиты от {payment_name}")
+                logger.info("Успешно получили реквизиты от %s", payment_name)
                 break
             else:
-                print(f"Платежка {payment_name} вернула пустые реквизиты")
+                logger.warning("Платежка %s вернула пустые реквизиты", payment_name)
         except Exception as e:
-            print(f"Ошибка в платежке {payment_name}: {str(e)}")
+            logger.warning("Ошибка в платежке %s: %s", payment_name, e)
             continue
 
     if not card_to:
@@ -8,6 +8,12 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from components.billing.integration.bitconce.BitMS import BitLogsModel
 from typing import Optional
+from utils.metrics import track_provider_call
+from utils.receipts import receipt_forwarder
+import asyncio
+import logging
+
+logger = logging.getLogger("app.integrations.bitconce")
 
 async def get_order_id(custom_id: int) -> Optional[int]:
     async for db in get_async_db():
@@ -20,36 +26,43 @@ async def get_order_id(custom_id: int) -> Optional[int]:
             return bit_log_model.bitconce_id
 
 
+BITCONCE_API_URL = "https://bitconce.top/api"
+
+
 api_rub_dep_credentials = APIClient(
-    base_url="https://bitconce.top/api", 
+    base_url=BITCONCE_API_URL, 
     headers={'Authorization': f'Bearer {settings.deposit_rub}'}
 )
 
 api_kzt_dep_credentials = APIClient(
-    base_url="https://bitconce.top/api",
+    base_url=BITCONCE_API_URL,
     headers={'Authorization': f'Bearer {settings.deposit_kzt}'}
 )
 
 api_rub_withdraw_credentials = APIClient(
-    base_url="https://bitconce.top/api",
+    base_url=BITCONCE_API_URL,
     headers={'Authorization': f'Bearer {settings.withdraw_rub}'}
 )
 
 api_kzt_withdraw_credentials = APIClient(
-    base_url="https://bitconce.top/api",
+    base_url=BITCONCE_API_URL,
     headers={'Authorization': f'Bearer {settings.withdraw_kzt}'}
 )
 
 class BitconceDepService:
-    def __init__(self, api: APIClient) -> None:
+    def __init__(self, api: APIClient, auth_token: str) -> None:
         self.api = api
+        # Для отправки чеков через receipt_forwarder (мимо APIClient)
+        self.auth_headers = {'Authorization': f'Bearer {auth_token}'}
 
+    @track_provider_call("bitconce")
     async def getAccountInfo(self) -> DepositAccountInfoResponse:
         account_info = await self.api.get("/getAccountInfo/")
         result = DepositAccountInfoResponse(**account_info)
         return result
         
 
+    @track_provider_call("bitconce")
     async def getOrderById(self, order_id: int) -> DepositOrderResponse:
         params = {'order_id': order_id}
         data = await self.api.get(path="/getOrderById/", params=params)
@@ -57,11 +70,12 @@ class BitconceDepService:
         return result
 
 
+    @track_provider_call("bitconce")
     async def createOrder(self, create: OrderRequest) -> OrderResponse:
-        print(f"BitConce Create: order request {create}")
+        logger.info("BitConce Create: order request %s", create)
 
         data = await self.api.post("/createOrder/", form_data=create.model_dump())
-        print(f"BitConce send response: {data}")
+        logger.info("BitConce send response: %s", data)
 
         if not data:
             from components.billing.services.TransactionServices import transaction_crud
@@ -88,13 +102,14 @@ class BitconceDepService:
         return order_info
 
 
+    @track_provider_call("bitconce")
     async def change_order_data(self, custom_id: str, proof: UploadFile = None, fiat_amount: float = None, files=None):
         order_id = await get_order_id(int(custom_id))
 
         if not order_id:
             raise f"Order ID: {order_id}"
 
-        print(f"BitConce Change Order Data: order_id {order_id}, custom_id {custom_id}, fiat_amount {fiat_amount}")
+        logger.info("BitConce Change Order Data: order_id %s, custom_id %s, fiat_amount %s", order_id, custom_id, fiat_amount)
         
         # Подготовка данных формы
         form_data = {
@@ -102,28 +117,29 @@ class BitconceDepService:
             'fiat_amount': str(fiat_amount) if fiat_amount is not None else '',
             'message': ''
         }
-        # Подготовка файлов
-        files = {}
-
-        # Обработка первого файла 'proof'
         if proof is not None:
-            proof_content = await proof.read()
-            files['proof'] = (proof.filename, proof_content, proof.content_type)
+            # Чек идёт через общий ReceiptForwarder, как у остальных провайдеров: сохранение и нормализация
+            # один раз, общий пул соединений, семафор на провайдера и потоковая отправка без чтения в память
+            data = await receipt_forwarder.send(
+                "bitconce",
+                f"{BITCONCE_API_URL}/checkOrder/",
+                "proof",
+                proof,
+                data=form_data,
+                headers=self.auth_headers,
+                extra_files={'proof_2': ('', b'')},
+            )
         else:
-            # Если файла нет, отправляем пустой файл с соответствующим MIME-типом
-            files['proof'] = ('', b'')
-
-        files['proof_2'] = ('', b'')
-
-
-        data = await self.api.send_files("/checkOrder/", data=form_data, files=files)
-        print(f"BitConce change order response: {data}")
+            # Если файла нет, отправляем пустые файлы, как ждёт API
+            files = {'proof': ('', b''), 'proof_2': ('', b'')}
+            data = await self.api.send_files("/checkOrder/", data=form_data, files=files)
+        logger.info("BitConce change order response: %s", data)
 
         # Проверка успешности ответа
         if not data or data.get('status') != "success":
             raise HTTPException(
                 status_code=status.HTTP_406_NOT_ACCEPTABLE,
-                detail=data.get('description', "BitConce don't send response..."),
+                detail=(data or {}).get('description', "BitConce don't send response..."),
             )
 
         # Преобразование данных ответа в нужный формат
@@ -155,16 +171,18 @@ class BitWithdrawService:
     def __init__(self, api: APIClient) -> None:
         self.api = api
 
+    @track_provider_call("bitconce_withdraw")
     async def getAccountInfo(self) -> WithdrawAccountInfoResponse:
         account_info = await self.api.get("/getAccountInfo/")
         result = WithdrawAccountInfoResponse(**account_info)
         return result
     
 
+    @track_provider_call("bitconce_withdraw")
     async def createOrder(self, create: OrderWithdrawRequest) -> OrderResponse:
         data = await self.api.post("/createExOrder/", form_data=create.model_dump())
         if data['status'] != "success":
-            print(data)
+            logger.warning("BitConce withdraw order error: %s", data)
             raise HTTPException(
                 status_code=status.HTTP_406_NOT_ACCEPTABLE,
                 detail=data['description'],
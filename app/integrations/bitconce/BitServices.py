@@ -8,13 +8,15 @@ from core.session import get_async_db
 from fastapi import Depends, HTTPException, status
 from components.billing.integration.bitconce.BitMS import BitLogsModel
 from sqlalchemy import select
+from utils.fx_rates import fx_rates
+from core.config import settings
 
 CRUD_bit = CRUDBase[BitLogsModel, BitLogSchema, BitLogSchema]
 bitconce_crud = CRUD_bit(BitLogsModel)
 
 
-bit_dep_rub = BitconceDepService(api_rub_dep_credentials)
-bit_dep_kzt = BitconceDepService(api_kzt_dep_credentials)
+bit_dep_rub = BitconceDepService(api_rub_dep_credentials, settings.deposit_rub)
+bit_dep_kzt = BitconceDepService(api_kzt_dep_credentials, settings.deposit_kzt)
 bit_with_rub = BitWithdrawService(api_rub_withdraw_credentials)
 bit_with_kzt = BitWithdrawService(api_kzt_withdraw_credentials)
 
@@ -26,6 +28,7 @@ async def deposit(currency:str, transaction_id:int, order: OrderRequest, session
         case "KZT":
             bit_order = await bit_dep_kzt.createOrder(order)
 
+    fx_rates.observe(currency, bit_order.data.curse, "bitconce")
 
     data = BitLogSchema(
         type='deposit',
@@ -1,4 +1,5 @@
 import json
+import logging
 import requests
 from typing import Union, Optional
 from enum import Enum
@@ -6,6 +7,11 @@ from pydantic import BaseModel, Field, ValidationError
 from typing import Optional, Literal
 from decimal import Decimal
 from fastapi import UploadFile, HTTPException
+from utils.metrics import track_provider_call
+from utils.receipts import receipt_forwarder
+from utils.uploads import StoredFile
+
+logger = logging.getLogger("app.integrations.onepayment")
 
 
 class DepositSchema(BaseModel):
@@ -111,6 +117,7 @@ class OnePaymentsService:
         return headers
 
 
+    @track_provider_call("onepayment")
     def _make_request(self, endpoint, method='GET', headers=None, params=None, json_data=None, data=None, files=None):
         url = f"{self.api_url}{endpoint}"
         if headers is None:
@@ -126,23 +133,17 @@ class OnePaymentsService:
                     response = requests.post(url, headers=headers, json=json_data, timeout=10)
             elif method == 'PATCH':
                 response = requests.patch(url, headers=headers, json=json_data, timeout=10)
-            print("OnePayment")
-            print("--------------------------------")
-            print(f"Ответ запроса: {response.status_code}, Text: {response.text}")
-            try:
-                print(f"Ответ запроса: {response.status_code}, Json: {response.json()}")
-            except:
-                pass
-            print("--------------------------------")
-            print(f"payload: {json_data} data: {data}")
-            print("--------------------------------")
-            print("OnePayment END")
+            logger.debug(
+                "OnePayment %s %s -> %s, payload: %s data: %s, response: %s",
+                method, url, response.status_code, json_data, data, response.text
+            )
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
-            print(f"Request error: {e}")
+            logger.warning("OnePayment request error: %s", e)
             return None
 
+    @track_provider_call("onepayment")
     def create_order(self, deposit_schema: DepositSchema) -> DepositResponse:
         
         # Поддержка и Pydantic v1, и Pydantic v2
@@ -183,10 +184,10 @@ class OnePaymentsService:
                     }
                     return DepositResponse(**response_obj)
                 else:
-                    print(f"Ответ не содержит ключ 'data': {response_data}")
+                    logger.warning("OnePayment: ответ не содержит ключ 'data': %s", response_data)
                     return response.json()
             except ValidationError as e:
-                print(f"Ошибка валидации ответа: {e}")
+                logger.warning("OnePayment: ошибка валидации ответа: %s", e)
                 return response.json()
         else:
             return response.json()
@@ -217,6 +218,21 @@ class OnePaymentsService:
         return self._make_request(endpoint, method='POST', headers=headers, data=form_data, files=files)
 
 
+    @track_provider_call("onepayment")
+    async def add_receipt_async(self, uuid: str, document: Union[UploadFile, StoredFile]):
+        """
+        Добавить чек к инвойсу. Файл отправляется потоково через общий async-клиент.
+        """
+        return await receipt_forwarder.send(
+            "onepayment",
+            f"{self.api_url}external_processing/payments/{uuid}/payment_receipts",
+            "image",
+            document,
+            data={'start_arbitration': 'false', 'comment': '', 'receipt_reason': ''},
+            headers={'Authorization': self._api_key, 'accept': 'application/json'},
+        )
+
+
     def change_payment_status(self, payment_id: str, status: str):
         '''
         /api/v1/external_processing/payments/{uuid}/statuses/{event}
@@ -1,7 +1,14 @@
+import logging
 import requests
 from pydantic import BaseModel
 import hashlib
 from fastapi import UploadFile
+from utils.metrics import track_provider_call
+from utils.receipts import receipt_forwarder
+from utils.uploads import StoredFile
+from typing import Union
+
+logger = logging.getLogger("app.integrations.paybridge")
 
 class PayBridgeDepositSchema(BaseModel):
     amount: float
@@ -36,6 +43,7 @@ class PayBridgeService:
         self._merchant_id = merchant_id
         self._api_secret = api_secret
 
+    @track_provider_call("paybridge")
     def _make_request(self, endpoint, method='GET', headers=None, params=None, json_data=None, data=None, files=None) -> dict | None:
         url = f"{self._api_url}{endpoint}"
         if headers is None:
@@ -52,7 +60,7 @@ class PayBridgeService:
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
-            print(f"Request error: {e}")
+            logger.warning("PayBridge request error: %s", e)
             return None
 
     def create_payment(self, data: PayBridgeDepositSchema) -> PayBridgeResponseSchema:
@@ -91,7 +99,7 @@ class PayBridgeService:
         try:
             return PayBridgeResponseSchema(**response)
         except Exception as e:
-            print({"details": response})
+            logger.warning("PayBridge create_payment unexpected response: %s", response)
             return {"details": response}
         
 
@@ -115,13 +123,13 @@ class PayBridgeService:
         
         # Создаем строку для подписи (transactionId + merchant_id + "pending")
         string_to_sign = f"merchant_id|{self._merchant_id}|transactionId|{transaction_id}|{self._api_secret}"
-        print("STRING: ", string_to_sign)
         # Генерируем SHA-1 хеш
         signature = hashlib.sha1(string_to_sign.encode('utf-8')).hexdigest()
         
         # Добавляем подпись к данным запроса
         request_data['signature'] = signature
-        print("SIGNATURE: ", signature)
+        # Строка для подписи не логируется: в ней секрет
+        logger.debug("PayBridge change_payment_status signature: %s", signature)
         headers = {
             "Content-Type": "application/json"
         }
@@ -131,7 +139,8 @@ class PayBridgeService:
         return response
 
 
-    async def check_payment_uploadfile(self, order_id: int, file: UploadFile):
+    @track_provider_call("paybridge")
+    async def check_payment_uploadfile(self, order_id: int, file: Union[UploadFile, StoredFile]):
         path = f"/api/auth/transaction/upload-api"
         data = {
             "merchant_id": self._merchant_id,
@@ -143,7 +152,8 @@ class PayBridgeService:
         string_to_sign = f"merchant_id|{self._merchant_id}|transactionId|{order_id}|{self._api_secret}"
         signature = hashlib.sha1(string_to_sign.encode('utf-8')).hexdigest()
         data['signature'] = signature
-        files = {'file': (file.filename, file.file, file.content_type)}
-        response = self._make_request(path, method="POST", headers=headers, data=data, files=files)
-        return response
+        # Раньше здесь был блокирующий requests внутри async-метода
+        return await receipt_forwarder.send(
+            "paybridge", f"{self._api_url}{path}", "file", file, data=data, headers=headers
+        )
 
@@ -1,4 +1,8 @@
+import logging
 import requests
+from utils.metrics import track_provider_call
+
+logger = logging.getLogger("app.integrations.paychain")
 
 class PayChainService:
     def __init__(self, api_key: str, api_url: str = 'https://api.paychain.fund/') -> None:
@@ -13,6 +17,7 @@ class PayChainService:
         return headers
 
 
+    @track_provider_call("paychain")
     def _make_request(self, endpoint, method='GET', headers=None, params=None, json_data=None, data=None, files=None):
         url = f"{self._api_url}{endpoint}"
         if headers is None:
@@ -28,19 +33,14 @@ class PayChainService:
                     response = requests.post(url, headers=headers, json=json_data, timeout=10)
             elif method == 'PATCH':
                 response = requests.patch(url, headers=headers, json=json_data, timeout=10)
-            print("--------------------------------")
-            print(f"Ответ запроса: {response.status_code}, Text: {response.text}")
-            try:
-                print(f"Ответ запроса: {response.status_code}, Json: {response.json()}")
-            except:
-                pass
-            print("--------------------------------")
-            print(f"payload: {json_data} data: {data}")
-            print("--------------------------------")
+            logger.debug(
+                "PayChain %s %s -> %s, payload: %s data: %s, response: %s",
+                method, url, response.status_code, json_data, data, response.text
+            )
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
-            print(f"Request error: {e}")
+            logger.warning("PayChain request error: %s", e)
             return None
 
         
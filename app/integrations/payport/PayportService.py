@@ -1,9 +1,16 @@
+import logging
 import requests
 import time
 from datetime import datetime, timedelta, timezone
 from pydantic import BaseModel
 from fastapi import UploadFile, HTTPException
 from utils.bot_sender import send_log
+from utils.metrics import track_provider_call
+from utils.receipts import receipt_forwarder
+from utils.uploads import StoredFile
+from typing import Union
+
+logger = logging.getLogger("app.integrations.payport")
 
 class PaymentData(BaseModel):
     rate: float
@@ -28,6 +35,7 @@ class PayportService:
         self._callback_url = call_back_url
     
 
+    @track_provider_call("payport")
     def _make_request(self, endpoint, method='GET', headers=None, params=None, json_data=None, data=None, files=None):
         url = f"{self._api_url}{endpoint}"
         if headers is None:
@@ -45,7 +53,7 @@ class PayportService:
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
-            print(f"Request error: {e}")
+            logger.warning("PayPort request error: %s", e)
             return None
 
 
@@ -89,21 +97,22 @@ class PayportService:
         return response_data
 
 
-    def payment_history(self, status=2):
-        '''Возвращает за последние 30 дней'''
+    def payment_history(self, status=2, from_date=None, to_date=None, page=None):
+        '''Возвращает за последние 30 дней, либо за from_date..to_date (мс UTC); page - страница выдачи'''
         endpoint = "/api/v3/payment/invoices"
         headers = {
             'Authorization': f"Bearer {self._api_v3}"
         }
         
         # Текущее время в UTC в миллисекундах
-        to_date = int(datetime.now(timezone.utc).timestamp() * 1000)
+        if to_date is None:
+            to_date = int(datetime.now(timezone.utc).timestamp() * 1000)
         
         # Время 30 дней назад в UTC в миллисекундах
-        from_date = to_date - 30 * 24 * 60 * 60 * 1000
+        if from_date is None:
+            from_date = to_date - 30 * 24 * 60 * 60 * 1000
         
-        # Для отладки: вывод временных меток
-        print(f"from_date (ms): {from_date}, to_date (ms): {to_date}")
+        logger.debug("PayPort payment_history from_date (ms): %s, to_date (ms): %s, page: %s", from_date, to_date, page)
         
         data = {
             "status": status,
@@ -111,11 +120,12 @@ class PayportService:
             "to_date": to_date,
             "locale": "ru"
         }
+        if page is not None:
+            data["page"] = page
         
         response = self._make_request(endpoint, 'POST', headers, json_data=data)
         
-        # Для отладки: вывод ответа
-        print(f"Response: {response}")
+        logger.debug("PayPort payment_history response: %s", response)
         
         return response
 
@@ -181,11 +191,11 @@ class PayportService:
         """ Обработка данных из колбэков. callback_data ожидается в виде dict """
         if 'status' in callback_data:
             if callback_data['status'] == 1:
-                print(f"Invoice {callback_data['invoice_id']} is paid.")
+                logger.info("Invoice %s is paid.", callback_data['invoice_id'])
             elif callback_data['status'] == -1:
-                print(f"Invoice {callback_data['invoice_id']} was canceled.")
+                logger.info("Invoice %s was canceled.", callback_data['invoice_id'])
             elif callback_data['status'] == 3:
-                print(f"Invoice {callback_data['invoice_id']} was confirmed by trader.")
+                logger.info("Invoice %s was confirmed by trader.", callback_data['invoice_id'])
         return callback_data
 
 
@@ -288,6 +298,19 @@ class PayportService:
         return self._make_request(endpoint, 'POST', headers=headers, data=data, files=files)
 
 
+    @track_provider_call("payport")
+    async def add_receipt_async(self, invoice_id: int, document: Union[UploadFile, StoredFile]):
+        """Добавить чек к инвойсу. Файл отправляется потоково через общий async-клиент"""
+        return await receipt_forwarder.send(
+            "payport",
+            f"{self._api_url}/api/v3/payment/confirm",
+            "document",
+            document,
+            data={'invoice_id': int(invoice_id)},
+            headers={'Authorization': f"Bearer {self._api_v3}"},
+        )
+
+
     def payment_withdraw_list(self, amount: float, currency: str):
         """Создание инвойса на оплату через API /api/v3/withdrawal/request"""
         endpoint = "/api/v3/withdrawal/request"
@@ -2,9 +2,12 @@ import hmac
 import hashlib
 import requests
 import json
+import logging
 from pydantic import BaseModel
 from typing import Optional
-from pprint import pprint
+from utils.metrics import track_provider_call
+
+logger = logging.getLogger("app.integrations.platipays")
 
 class ResponseCreate(BaseModel):
     success: bool
@@ -44,7 +47,6 @@ class PlatiPaysService:
     def make_headers(self, payload: str) -> dict:
         payload_str = json.dumps(payload)  # возможно вернут separators=(',', ':')
         signature = self.make_signature(payload_str)
-        pprint(signature)
         headers = {
             'Content-Type': "application/json",
             'Signature': signature,
@@ -52,6 +54,7 @@ class PlatiPaysService:
         }
         return headers
 
+    @track_provider_call("platipays")
     def create_order(self, amount: float, order_id: str, user_id: str) -> ResponseCreate:
         url = f"{self.BASE_URL}/payment/deposit"
 
@@ -67,15 +70,15 @@ class PlatiPaysService:
         }
 
         headers = self.make_headers(payload)
-        pprint(payload)
         resp = requests.post(url, headers=headers, json=payload)
         
         response_data = resp.json()
-        print(response_data)
+        logger.debug("PlatiPays create_order payload: %s, response: %s", payload, response_data)
         return ResponseCreate(**response_data)
 
 
-    def details_order(self, bill_id: str, order_type: str) -> ResponseInfo:
+    @track_provider_call("platipays")
+    def details_order(self, bill_id: str, order_type: str, timeout: float = 10) -> ResponseInfo:
         url = f"{self.BASE_URL}/payment/details"
 
         payload = {
@@ -84,12 +87,10 @@ class PlatiPaysService:
         }
 
         headers = self.make_headers(payload)
-        pprint(payload)
-        resp = requests.post(url, headers=headers, json=payload)
+        resp = requests.post(url, headers=headers, json=payload, timeout=timeout)
         
         response_data = resp.json()
-        pprint(response_data)
-        print("")
+        logger.debug("PlatiPays details_order payload: %s, response: %s", payload, response_data)
         return ResponseInfo(**response_data)
 
 
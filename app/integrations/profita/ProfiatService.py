@@ -1,4 +1,5 @@
 import base64
+import logging
 import time
 import datetime
 import random
@@ -8,6 +9,9 @@ from typing import Optional, Dict, Any
 import requests
 import jwt
 from pydantic import BaseModel, Field
+from utils.metrics import track_provider_call
+
+logger = logging.getLogger("app.integrations.profiat")
 
 
 class ProfiatAuthConfig(BaseModel):
@@ -124,6 +128,7 @@ class ProfiatService:
             "Authorization": f"JWT {self._token}",
         }
 
+    @track_provider_call("profiat")
     def _request(self, method: str, path: str, json_payload: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         url = f"https://{self._auth.host}{path}"
         headers = self._headers()
@@ -132,13 +137,11 @@ class ProfiatService:
         else:
             resp = requests.post(url, headers=headers, json=json_payload, timeout=15)
 
-        # Лог диагностический (при необходимости можно убрать/сменить на logger)
-        print("--------------------------------")
-        print(f"Request: {method} {url}")
-        if json_payload:
-            print(f"Payload: {json.dumps(json_payload, ensure_ascii=False)}")
-        print(f"Response: {resp.status_code} {resp.text}")
-        print("--------------------------------")
+        # Диагностический лог: payload сериализуется только если debug включён
+        logger.debug(
+            "Profiat %s %s -> %s, payload: %s, response: %s",
+            method, url, resp.status_code, json_payload, resp.text
+        )
 
         try:
             return resp.json()
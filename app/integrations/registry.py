@@ -0,0 +1,123 @@
+import threading
+from typing import Any, Callable
+
+from core.config import settings
+
+
+class ProviderConfigError(RuntimeError):
+    '''У провайдера не заданы обязательные настройки'''
+
+
+class ProviderRegistry:
+    '''
+    Ленивые клиенты платёжных провайдеров.
+    Клиент создаётся при первом обращении, после проверки обязательных настроек,
+    и дальше переиспользуется. Модуль провайдера импортируется внутри фабрики,
+    поэтому импорт integrations и старт воркера не зависят от конфигурации провайдеров.
+    '''
+
+    def __init__(self) -> None:
+        self._factories: dict[str, tuple[Callable[[], Any], tuple[str, ...]]] = {}
+        self._clients: dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable[[], Any], required: tuple[str, ...] = ()) -> None:
+        self._factories[name] = (factory, required)
+
+    def missing_settings(self, name: str) -> list[str]:
+        _, required = self._factories[name]
+        return [key for key in required if not getattr(settings, key, None)]
+
+    def is_configured(self, name: str) -> bool:
+        return name in self._factories and not self.missing_settings(name)
+
+    def get(self, name: str) -> Any:
+        client = self._clients.get(name)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._clients.get(name)
+            if client is not None:
+                return client
+            if name not in self._factories:
+                raise ProviderConfigError(f"Unknown payment provider: {name}")
+            missing = self.missing_settings(name)
+            if missing:
+                raise ProviderConfigError(f"Provider {name} is not configured, missing: {', '.join(missing)}")
+            factory, _ = self._factories[name]
+            client = self._clients[name] = factory()
+            return client
+
+    def reset(self, name: str = None) -> None:
+        '''Сбросить созданные клиенты (после смены настроек)'''
+        with self._lock:
+            if name is None:
+                self._clients.clear()
+            else:
+                self._clients.pop(name, None)
+
+
+def _paybridge():
+    from integrations.paybridge.PayBridgeService import PayBridgeService
+    return PayBridgeService(
+        api_url=settings.PAYBRIDGE_API_URL,
+        merchant_id=settings.PAYBRIDGE_MERCHANT_ID,
+        api_secret=settings.PAYBRIDGE_API_SECRET
+    )
+
+
+def _paychain():
+    from integrations.paychain.PayChainService import PayChainService
+    return PayChainService(settings.PAYCHAINT_API_KEY, settings.PAYCHAINT_API_URL)
+
+
+def _platipay():
+    from integrations.platipays.PlatiPaysService import PlatiPaysService
+    return PlatiPaysService(
+        callback_url=settings.PLATI_PAYS_CALLBACK,
+        APIKEY=settings.PLATI_PAYS_KEY,
+        secret_key=settings.PLATI_PAYS_SECRET
+    )
+
+
+def _profiat():
+    from integrations.profita.ProfiatService import ProfiatService
+    return ProfiatService(
+        host=settings.PROFIAT_HOST,
+        kid=settings.PROFIAT_UID,
+        private_key_b64=settings.PROFIAT_KEY
+    )
+
+
+def _onepayment_kz():
+    from integrations.onepayment.OnePaymentService import OnePaymentsService
+    return OnePaymentsService(
+        api_key=settings.ONEPAYMENT_API_KEY_KZ,
+        hook_url=settings.ONEPAYMENT_HOOK_URL_KZ,
+        api_url=settings.ONEPAYMENT_API_URL_KZ
+    )
+
+
+def _payport():
+    from integrations.payport.PayportService import PayportService
+    return PayportService(
+        settings.PAYPORT_API3_KEY,
+        settings.PAYPORT_API5_KEY,
+        settings.PAYPORT_API_URL,
+        settings.PAYPORT_HOOK_URL
+    )
+
+
+def _settlement():
+    from integrations.settlement.SettlementService import SettlementService
+    return SettlementService(settings.SETTLEMENT_API_URL, settings.SETTLEMENT_AUTH_TOKEN)
+
+
+providers = ProviderRegistry()
+providers.register("paybridge", _paybridge, ("PAYBRIDGE_API_URL", "PAYBRIDGE_MERCHANT_ID", "PAYBRIDGE_API_SECRET"))
+providers.register("paychain", _paychain, ("PAYCHAINT_API_KEY", "PAYCHAINT_API_URL"))
+providers.register("platipay", _platipay, ("PLATI_PAYS_CALLBACK", "PLATI_PAYS_KEY", "PLATI_PAYS_SECRET"))
+providers.register("profiat", _profiat, ("PROFIAT_HOST", "PROFIAT_UID", "PROFIAT_KEY"))
+providers.register("onepayment_kz", _onepayment_kz, ("ONEPAYMENT_API_KEY_KZ", "ONEPAYMENT_HOOK_URL_KZ", "ONEPAYMENT_API_URL_KZ"))
+providers.register("payport", _payport, ("PAYPORT_API3_KEY", "PAYPORT_API5_KEY", "PAYPORT_API_URL", "PAYPORT_HOOK_URL"))
+providers.register("settlement", _settlement, ("SETTLEMENT_API_URL",))
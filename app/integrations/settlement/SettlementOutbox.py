@@ -0,0 +1,58 @@
+import asyncio
+from typing import Any
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from integrations.registry import providers
+from integrations.settlement.SettlementService import SettOrderRequest, TransferRequest
+from models.OutboxModel import OutboxModel
+from utils.outbox import enqueue, outbox_dispatcher
+
+
+class SettlementCallFailed(RuntimeError):
+    '''SettlementService вернул None - запрос не прошёл, сообщение уйдёт на повтор'''
+
+
+async def _call(method: str, *args, **kwargs) -> Any:
+    # Клиент синхронный (requests), поэтому в потоке. Ошибку он логирует сам и возвращает None
+    response = await asyncio.to_thread(getattr(providers.get("settlement"), method), *args, **kwargs)
+    if response is None:
+        raise SettlementCallFailed(f"settlement.{method} failed")
+    return response.model_dump(mode="json")
+
+
+@outbox_dispatcher.register("settlement.create_order")
+async def _create_order(payload: dict, key: str) -> Any:
+    return await _call("create_order", SettOrderRequest(**payload), idempotency_key=key)
+
+
+@outbox_dispatcher.register("settlement.create_transfer")
+async def _create_transfer(payload: dict, key: str) -> Any:
+    return await _call("create_transfer", TransferRequest(**payload), idempotency_key=key)
+
+
+# Установка суммы и статуса идемпотентна сама по себе, повтор ничего не меняет
+@outbox_dispatcher.register("settlement.change_order_amount")
+async def _change_order_amount(payload: dict, key: str) -> Any:
+    return await _call("change_order_amount", payload["order_id"], payload["new_amount"])
+
+
+@outbox_dispatcher.register("settlement.change_order_status")
+async def _change_order_status(payload: dict, key: str) -> Any:
+    return await _call("change_order_status", payload["order_id"], payload["status_id"])
+
+
+async def enqueue_create_order(session: AsyncSession, order_data: SettOrderRequest) -> OutboxModel:
+    return await enqueue(session, "settlement.create_order", order_data.model_dump(mode="json"))
+
+
+async def enqueue_create_transfer(session: AsyncSession, transfer_data: TransferRequest) -> OutboxModel:
+    return await enqueue(session, "settlement.create_transfer", transfer_data.model_dump(mode="json"))
+
+
+async def enqueue_change_order_amount(session: AsyncSession, order_id: int, new_amount: float) -> OutboxModel:
+    return await enqueue(session, "settlement.change_order_amount", {"order_id": order_id, "new_amount": new_amount})
+
+
+async def enqueue_change_order_status(session: AsyncSession, order_id: int, status_id: int) -> OutboxModel:
+    return await enqueue(session, "settlement.change_order_status", {"order_id": order_id, "status_id": status_id})
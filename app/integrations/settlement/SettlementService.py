@@ -2,8 +2,12 @@ from typing import Optional, Tuple
 from pydantic import BaseModel
 from datetime import datetime
 from decimal import Decimal
+import logging
 import requests
 import time
+from utils.metrics import track_provider_call
+
+logger = logging.getLogger("app.integrations.settlement")
 
 
 class SettOrderRequest(BaseModel):
@@ -80,6 +84,20 @@ class ChangeStatusRequest(BaseModel):
     status_id: int
 
 
+def map_deposit_status(transaction_status_id: int) -> Optional[int]:
+    """Статус транзакции -> статус ордера в settlement. None - статус не синхронизируется"""
+    match transaction_status_id: # FIXME: статус 5 это ошибка, она может возникать в атоматизации поэтому не обрабатываем
+        case 11 | 9 | 8 | 7 | 6:
+            return 2
+        case 4:
+            return 4
+        case 3:
+            return 1
+        case _:
+            return None
+
+
+@track_provider_call("settlement")
 def check_available_amount(amount: float, currency: str, player_id: str = None, rating: int = None) -> bool:
     """
     Проверяет доступность указанной суммы через API биллинга.
@@ -113,7 +131,7 @@ def check_available_amount(amount: float, currency: str, player_id: str = None,
         # Прямой возврат результата как булева значения
         return response.json()
     except Exception as e:
-        print(f"Error checking available amount: {e}")
+        logger.warning("Error checking available amount: %s", e)
         return None
 
 
@@ -127,12 +145,14 @@ class SettlementService:
             'Authorization': 'test'
         }
 
-    def create_order(self, order_data: SettOrderRequest) -> Optional[OrderResponse]:
+    @track_provider_call("settlement")
+    def create_order(self, order_data: SettOrderRequest, idempotency_key: Optional[str] = None) -> Optional[OrderResponse]:
         """
         Create a new order using the provided order data.
         
         Args:
             order_data (SettOrderRequest): The order data to be sent
+            idempotency_key (str): Sent as Idempotency-Key so a retried call is not applied twice
             
         Returns:
             Optional[OrderResponse]: The validated response from the API if successful, None otherwise
@@ -144,6 +164,8 @@ class SettlementService:
             'Origin': self._api_url,
             'Referer': f'{self._api_url}/docs',
         }
+        if idempotency_key:
+            headers['Idempotency-Key'] = idempotency_key
 
         try:
             response = requests.post(
@@ -156,15 +178,16 @@ class SettlementService:
             response.raise_for_status()
             return OrderResponse(**response.json())
         except requests.exceptions.RequestException as e:
-            print(f"Error creating order: {e}")
+            logger.warning("Error creating order: %s", e)
             if hasattr(e, 'response') and e.response is not None:
-                print(f"Server response: {e.response.text}")
+                logger.warning("Server response: %s", e.response.text)
             return None
         except ValueError as e:
-            print(f"Error parsing response data: {e}")
+            logger.warning("Error parsing response data: %s", e)
             return None
 
 
+    @track_provider_call("settlement")
     def finish_order(self, order_id: str) -> Optional[OrderResponse]:
         """
         Retrieve order details by order ID.
@@ -189,15 +212,16 @@ class SettlementService:
             response.raise_for_status()
             return OrderResponse(**response.json())
         except requests.exceptions.RequestException as e:
-            print(f"Error retrieving order: {e}")
+            logger.warning("Error retrieving order: %s", e)
             if hasattr(e, 'response') and e.response is not None:
-                print(f"Server response: {e.response.text}")
+                logger.warning("Server response: %s", e.response.text)
             return None
         except ValueError as e:
-            print(f"Error parsing response data: {e}")
+            logger.warning("Error parsing response data: %s", e)
             return None
 
 
+    @track_provider_call("settlement")
     def get_order(self, order_id: str) -> Optional[OrderResponse]:
         """
         Retrieve order details by order ID.
@@ -222,20 +246,22 @@ class SettlementService:
             response.raise_for_status()
             return OrderResponse(**response.json())
         except requests.exceptions.RequestException as e:
-            print(f"Error retrieving order: {e}")
+            logger.warning("Error retrieving order: %s", e)
             if hasattr(e, 'response') and e.response is not None:
-                print(f"Server response: {e.response.text}")
+                logger.warning("Server response: %s", e.response.text)
             return None
         except ValueError as e:
-            print(f"Error parsing response data: {e}")
+            logger.warning("Error parsing response data: %s", e)
             return None
 
-    def create_transfer(self, transfer_data: TransferRequest) -> Optional[TransferResponse]:
+    @track_provider_call("settlement")
+    def create_transfer(self, transfer_data: TransferRequest, idempotency_key: Optional[str] = None) -> Optional[TransferResponse]:
         """
         Create a new transfer using the provided data.
         
         Args:
             transfer_data (TransferRequest): The transfer data to be sent
+            idempotency_key (str): Sent as Idempotency-Key so a retried call is not applied twice
             
         Returns:
             Optional[dict]: The response from the API if successful, None otherwise
@@ -244,6 +270,8 @@ class SettlementService:
             'Accept': 'application/json',
             'Content-Type': 'application/json',
         }
+        if idempotency_key:
+            headers['Idempotency-Key'] = idempotency_key
 
         try:
             response = requests.post(
@@ -256,12 +284,13 @@ class SettlementService:
             response.raise_for_status()
             return TransferResponse(**response.json())
         except requests.exceptions.RequestException as e:
-            print(f"Error creating transfer: {e}")
+            logger.warning("Error creating transfer: %s", e)
             if hasattr(e, 'response') and e.response is not None:
-                print(f"Server response: {e.response.text}")
+                logger.warning("Server response: %s", e.response.text)
             return None
 
 
+    @track_provider_call("settlement")
     def change_order_amount(self, order_id: int, new_amount: float) -> Optional[OrderResponse]:
         """
         Изменить сумму существующего ордера.
@@ -291,15 +320,16 @@ class SettlementService:
             response.raise_for_status()
             return OrderResponse(**response.json())
         except requests.exceptions.RequestException as e:
-            print(f"Error changing order amount: {e}")
+            logger.warning("Error changing order amount: %s", e)
             if hasattr(e, 'response') and e.response is not None:
-                print(f"Server response: {e.response.text}")
+                logger.warning("Server response: %s", e.response.text)
             return None
         except ValueError as e:
-            print(f"Error parsing response data: {e}")
+            logger.warning("Error parsing response data: %s", e)
             return None
 
 
+    @track_provider_call("settlement")
     def change_order_status(self, order_id: int, status_id: int) -> Optional[OrderResponse]:
         """
         Изменить сумму существующего ордера.
@@ -329,17 +359,21 @@ class SettlementService:
             response.raise_for_status()
             return OrderResponse(**response.json())
         except requests.exceptions.RequestException as e:
-            print(f"Error changing order amount: {e}")
+            logger.warning("Error changing order amount: %s", e)
             if hasattr(e, 'response') and e.response is not None:
-                print(f"Server response: {e.response.text}")
+                logger.warning("Server response: %s", e.response.text)
             return None
         except ValueError as e:
-            print(f"Error parsing response data: {e}")
+            logger.warning("Error parsing response data: %s", e)
             return None
 
 
+    @track_provider_call("settlement")
     def sync_order_deposit_status(self, order_id: int, transaction_status_id: int) -> Optional[OrderResponse]:
         """
+        Блокирующий вариант. Новый код вызывает settlement_sync.sync() (SettlementSync): склейка переходов
+        и порядок статусов одного ордера.
+
         Изменить сумму существующего ордера.
         
         Args:
@@ -354,17 +388,9 @@ class SettlementService:
             'Content-Type': 'application/json',
         }
 
-        status_id = 0
-        
-        match transaction_status_id: # FIXME: статус 5 это ошибка, она может возникать в атоматизации поэтому не обрабатываем
-            case 11 | 9 | 8 | 7 | 6:
-                status_id = 2
-            case 4:
-                status_id = 4
-            case 3:
-                status_id = 1
-            case _:
-                return None
+        status_id = map_deposit_status(transaction_status_id)
+        if status_id is None:
+            return None
 
         data = ChangeStatusRequest(status_id=status_id)
         
@@ -379,14 +405,15 @@ class SettlementService:
             response.raise_for_status()
             return OrderResponse(**response.json())
         except requests.exceptions.RequestException as e:
-            print(f"Error changing order amount: {e}")
+            logger.warning("Error changing order amount: %s", e)
             if hasattr(e, 'response') and e.response is not None:
-                print(f"Server response: {e.response.text}")
+                logger.warning("Server response: %s", e.response.text)
             return None
         except ValueError as e:
-            print(f"Error parsing response data: {e}")
+            logger.warning("Error parsing response data: %s", e)
             return None
 
+    @track_provider_call("settlement")
     def create_payment(self, amount: float, currency: str, player_id: str = None, rating: int = None) -> dict:
         """
         Создает новый платеж через API биллинга.
@@ -411,9 +438,10 @@ class SettlementService:
             response.raise_for_status()
             return response.json()
         except Exception as e:
-            print(f"Error creating payment: {e}")
+            logger.warning("Error creating payment: %s", e)
             return None
 
+    @track_provider_call("settlement")
     def check_payment(self, payment_id: str) -> dict:
         """
         Проверяет статус платежа через API биллинга.
@@ -432,9 +460,10 @@ class SettlementService:
             response.raise_for_status()
             return response.json()
         except Exception as e:
-            print(f"Error checking payment: {e}")
+            logger.warning("Error checking payment: %s", e)
             return None
 
+    @track_provider_call("settlement")
     def cancel_payment(self, payment_id: str) -> bool:
         """
         Отменяет платеж через API биллинга.
@@ -453,9 +482,10 @@ class SettlementService:
             response.raise_for_status()
             return True
         except Exception as e:
-            print(f"Error canceling payment: {e}")
+            logger.warning("Error canceling payment: %s", e)
             return False
 
+    @track_provider_call("settlement")
     def get_payment_methods(self) -> list:
         """
         Получает список доступных методов оплаты через API биллинга.
@@ -471,9 +501,10 @@ class SettlementService:
             response.raise_for_status()
             return response.json()
         except Exception as e:
-            print(f"Error getting payment methods: {e}")
+            logger.warning("Error getting payment methods: %s", e)
             return []
 
+    @track_provider_call("settlement")
     def get_payment_history(self, player_id: str = None) -> list:
         """
         Получает историю платежей через API биллинга.
@@ -493,7 +524,7 @@ class SettlementService:
             response.raise_for_status()
             return response.json()
         except Exception as e:
-            print(f"Error getting payment history: {e}")
+            logger.warning("Error getting payment history: %s", e)
             return []
 
 
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+import httpx
+
+from core.config import settings
+from integrations.settlement.SettlementService import ChangeStatusRequest, OrderResponse, map_deposit_status
+from utils.metrics import registry
+
+logger = logging.getLogger("app.integrations.settlement")
+
+settlement_sync_batch_seconds = registry.histogram(
+    "settlement_sync_batch_seconds", "Время отправки пачки статусов в settlement",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+settlement_sync_batch_size = registry.histogram(
+    "settlement_sync_batch_size", "Ордеров в пачке синхронизации статусов",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250),
+)
+settlement_sync_coalesced = registry.counter(
+    "settlement_sync_coalesced_total", "Переходы статуса, поглощённые более поздним в том же окне",
+)
+
+
+class SettlementSync:
+    '''
+    Синхронизация статусов депозитов с settlement.
+    Переходы копятся window секунд; по одному ордеру в пачку попадает только последний статус,
+    все ожидающие этого ордера получают один и тот же результат. Пачка отправляется параллельно
+    через общий пул соединений httpx, не больше concurrency запросов одновременно.
+    Пока POST ордера в полёте, его следующий статус ждёт (и склеивается с последующими) и уходит
+    только после ответа: два запроса одного ордера не идут параллельно, старый статус не перезапишет новый.
+    Пока нигде не вызывается: код смены статуса транзакции в этом репозитории отсутствует,
+    вызывающая сторона должна перейти с SettlementService.sync_order_deposit_status на sync().
+    '''
+
+    def __init__(
+        self,
+        api_url: str,
+        auth_token: str,
+        window: float = 0.2,
+        concurrency: int = 8,
+        max_connections: int = 20,
+        timeout: float = 10,
+    ) -> None:
+        self._api_url = api_url.rstrip('/')
+        self._cookies = {
+            'auth_token': auth_token,
+            'bearer': 'string',
+            'Authorization': 'test'
+        }
+        self.window = window
+        self.concurrency = concurrency
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # order_id -> (статус settlement, future результата)
+        self._pending: dict[int, tuple[int, asyncio.Future]] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._batches: set[asyncio.Task] = set()
+        # Ордера, чей POST сейчас в полёте
+        self._inflight: set[int] = set()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                headers={'Accept': 'application/json', 'Content-Type': 'application/json'},
+                cookies=self._cookies,
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+            )
+        return self._client
+
+    def submit(self, order_id: int, transaction_status_id: int) -> Optional[asyncio.Future]:
+        '''
+        Поставить переход статуса в очередь. Возвращает future с OrderResponse (None при ошибке)
+        или None, если статус транзакции в settlement не синхронизируется.
+        '''
+        status_id = map_deposit_status(transaction_status_id)
+        if status_id is None:
+            return None
+        loop = asyncio.get_running_loop()
+        pending = self._pending.get(order_id)
+        if pending is not None:
+            # Ордер уже ждёт отправки - заменяем статус, future остаётся общим
+            settlement_sync_coalesced.inc()
+            future = pending[1]
+        else:
+            future = loop.create_future()
+        self._pending[order_id] = (status_id, future)
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._start_batch)
+        return future
+
+    async def sync(self, order_id: int, transaction_status_id: int) -> Optional[OrderResponse]:
+        '''Async-замена SettlementService.sync_order_deposit_status'''
+        future = self.submit(order_id, transaction_status_id)
+        if future is None:
+            return None
+        return await asyncio.shield(future)
+
+    def _start_batch(self) -> None:
+        self._flush_handle = None
+        # Ордера с запросом в полёте остаются в _pending до его ответа
+        batch = {order_id: item for order_id, item in self._pending.items() if order_id not in self._inflight}
+        if batch:
+            for order_id in batch:
+                del self._pending[order_id]
+            self._inflight.update(batch)
+            task = asyncio.create_task(self._send_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    def _finish(self, order_ids) -> None:
+        self._inflight.difference_update(order_ids)
+        if self._pending and self._flush_handle is None:
+            # Отложенные статусы этих ордеров уходят следующей пачкой
+            self._flush_handle = asyncio.get_running_loop().call_later(self.window, self._start_batch)
+
+    async def _send_batch(self, batch: dict[int, tuple[int, asyncio.Future]]) -> None:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        start = time.perf_counter()
+        try:
+            results = await asyncio.gather(
+                *(self._send(order_id, status_id) for order_id, (status_id, _) in batch.items()),
+                return_exceptions=True,
+            )
+        finally:
+            self._finish(batch)
+        elapsed = time.perf_counter() - start
+        settlement_sync_batch_seconds.observe(elapsed)
+        settlement_sync_batch_size.observe(len(batch))
+        failed = 0
+        for (_, future), result in zip(batch.values(), results):
+            if isinstance(result, BaseException) or result is None:
+                failed += 1
+                result = None
+            if not future.done():
+                future.set_result(result)
+        logger.info("Settlement sync batch: %s orders, %s failed, %.3fs", len(batch), failed, elapsed)
+
+    async def _send(self, order_id: int, status_id: int) -> Optional[OrderResponse]:
+        data = ChangeStatusRequest(status_id=status_id)
+        async with self._semaphore:
+            try:
+                response = await self.client.post(
+                    f'{self._api_url}/api/v1/transfer/{order_id}/status',
+                    json=data.model_dump(),
+                )
+                response.raise_for_status()
+                return OrderResponse(**response.json())
+            except httpx.HTTPStatusError as e:
+                logger.warning("Error syncing order %s status: %s, server response: %s", order_id, e, e.response.text)
+                return None
+            except (httpx.HTTPError, ValueError) as e:
+                logger.warning("Error syncing order %s status: %s", order_id, e)
+                return None
+
+    async def close(self) -> None:
+        '''Дослать накопленное (включая статусы, ждавшие ответа по своему ордеру) и закрыть пул соединений'''
+        while self._pending or self._batches:
+            if self._flush_handle is not None:
+                self._flush_handle.cancel()
+                self._flush_handle = None
+            self._start_batch()
+            if self._batches:
+                await asyncio.gather(*self._batches, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+settlement_sync = SettlementSync(
+    settings.SETTLEMENT_API_URL,
+    settings.SETTLEMENT_AUTH_TOKEN,
+    window=settings.SETTLEMENT_SYNC_WINDOW,
+    concurrency=settings.SETTLEMENT_SYNC_CONCURRENCY,
+    max_connections=settings.SETTLEMENT_SYNC_MAX_CONNECTIONS,
+)
@@ -1,14 +1,29 @@
+import hmac
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 import uvicorn
 from fastapi import FastAPI, Depends, HTTPException, Response, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from core.config import settings
 from routers import routers_api
-from typing import Callable
-import time
+from contextlib import asynccontextmanager
 from utils.logger import setup_logging
+from utils.fx_rates import fx_rates
+from utils.uploads import ImmutableStaticFiles, upload_storage
+from utils.receipts import receipt_forwarder
+from utils.receipt_images import receipt_normalizer
+from utils.webhooks import webhook_workers
+from utils.status_poller import status_poller
+from integrations.settlement.SettlementSync import settlement_sync
+from integrations.settlement import SettlementOutbox  # noqa: F401 - регистрирует обработчики outbox
+from integrations import WebhookHandlers  # noqa: F401 - регистрирует обработчики колбэков
+from utils.outbox import outbox_dispatcher
+from utils.request_logging import RequestLoggingMiddleware
+from utils.metrics import registry
+from utils.loop_lag import loop_lag_monitor
+from utils.profiling import ProfilingMiddleware, profile_store, continuous_profiler
+from dependencies.auth import is_admin_token
+from fastapi.responses import PlainTextResponse
 
 
 logger = setup_logging()
@@ -27,87 +42,70 @@ def cors_setup(app):
             "Authorization",
             "Access-Control-Allow-Origin",
         ],
+        expose_headers=["X-Next-Cursor", "X-Profile-File"],
     )
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Фоновые сервисы процесса
+    fx_rates.start()
+    loop_lag_monitor.start()
+    if settings.WEBHOOK_WORKERS_ENABLED:
+        webhook_workers.start()
+    if settings.STATUS_POLLER_ENABLED:
+        status_poller.start()
+    if settings.OUTBOX_ENABLED:
+        outbox_dispatcher.start()
+    yield
+    await outbox_dispatcher.stop()
+    await status_poller.stop()
+    await webhook_workers.stop()
+    await loop_lag_monitor.stop()
+    await fx_rates.stop()
+    continuous_profiler.stop()
+    await receipt_forwarder.close()
+    await settlement_sync.close()
+    receipt_normalizer.shutdown()
+
+
+# Метрики в текстовом формате Prometheus. Только для администратора или скрапера с METRICS_TOKEN
+async def metrics(request: Request):
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return PlainTextResponse("Not authenticated", status_code=401, headers={"WWW-Authenticate": "Bearer"})
+    allowed = bool(settings.METRICS_TOKEN) and hmac.compare_digest(token.encode(), settings.METRICS_TOKEN.encode())
+    if not allowed and not await is_admin_token(token):
+        return PlainTextResponse("Insufficient permissions", status_code=403)
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
 def start_application():
-    app = FastAPI()
+    app = FastAPI(lifespan=lifespan)
     app.include_router(routers_api)
+    if settings.METRICS_ENABLED:
+        app.add_route("/metrics", metrics, include_in_schema=False)
+    # Профиль запроса по X-Profile (только для администратора)
+    app.add_middleware(
+        ProfilingMiddleware,
+        store=profile_store,
+        authorize=is_admin_token,
+        interval=settings.PROFILE_REQUEST_INTERVAL,
+    )
     cors_setup(app)
-    app.mount("/uploads", StaticFiles(directory=str(settings.BASE_DIR) + "/uploads"), name="uploads")
+    # Добавляется последним, поэтому оборачивает всё приложение, включая CORS
+    app.add_middleware(
+        RequestLoggingMiddleware,
+        body_limit=settings.REQUEST_LOG_BODY_LIMIT,
+        history_size=settings.REQUEST_LOG_HISTORY_SIZE,
+    )
+    app.mount("/uploads", ImmutableStaticFiles(directory=upload_storage.directory), name="uploads")
     return app
 
 
 app = start_application()
 
 
-@app.middleware("http")
-async def log_requests(request: Request, call_next: Callable):
-    start_time = time.time()
-    
-    # Считываем тело запроса в память
-    request_body = await request.body()
-    
-    # Переопределяем метод receive
-    async def receive_override():
-        return {
-            "type": "http.request",
-            "body": request_body,
-            "more_body": False
-        }
-
-    modified_request = Request(request.scope, receive_override)
-
-    try:
-        # Отдаём запрос дальше
-        response = await call_next(modified_request)
-        duration = time.time() - start_time
-        
-        # ИСПРАВЛЕНО: Проверяем, не вернулся ли статус-код ошибки (4xx, 5xx)
-        if response.status_code >= 400:  # Заменил True на response.status_code >= 400
-            logger.error(
-                f"⛑️ Ошибка: {response.status_code}. "
-                f"Метод: {request.method}, Путь: {request.url.path}, Время: {duration:.2f}s"
-            )
-            # Логируем тело запроса только при ошибках
-            logger.error(f"Тело запроса: {request_body.decode('utf-8', errors='replace')}")
-
-            # Читаем тело ответа
-            response_body = b"".join([chunk async for chunk in response.body_iterator])
-            logger.error(f"Тело ответа: {response_body.decode('utf-8', errors='replace')}")
-
-            return Response(
-                content=response_body,
-                status_code=response.status_code,
-                headers=dict(response.headers),
-                media_type=response.media_type
-            )
-
-        # Если всё ок, просто логируем инфо-лог
-        logger.info(
-            f"✅ Успех: {response.status_code}. Метод: {request.method}, Путь: {request.url.path}, "
-            f"Время: {duration:.2f}s"
-        )
-
-        return response
-
-    except Exception as e:
-        # Остальная часть кода остаётся без изменений
-        duration = time.time() - start_time
-        logger.error(
-            f"💥 Internal Server Error (500). "
-            f"Method: {request.method}, Path: {request.url.path}, Duration: {duration:.2f}s Error: {str(e)}"
-        )
-        logger.error(f"Тело запроса: {request_body.decode('utf-8', errors='replace')}")
-        logger.exception("Full traceback:")
-        
-        return Response(
-            content='{"detail": "Internal Server Error"}',
-            media_type="application/json",
-            status_code=500
-        )
-
-
 if __name__ == "__main__":
     uvicorn.run(
         app,
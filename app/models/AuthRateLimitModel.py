@@ -0,0 +1,13 @@
+from sqlalchemy import Column, String, Float
+from core.db import Base
+
+class AuthRateLimitModel(Base):
+    '''
+    Общее состояние token bucket для нескольких воркеров (AUTH_RATE_LIMIT_BACKEND=postgres).
+    Миграций нет, таблица создаётся до включения backend:
+    CREATE TABLE auth_rate_limits (key VARCHAR PRIMARY KEY, tokens DOUBLE PRECISION NOT NULL, updated_at DOUBLE PRECISION NOT NULL);
+    '''
+    __tablename__ = "auth_rate_limits"
+    key = Column(String, primary_key=True)
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False) # unix-время последнего списания
@@ -1,9 +1,16 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ARRAY
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Index, select, text, union_all
+from sqlalchemy.dialects.postgresql import ARRAY # contains/overlap есть только у postgres-типа
 from sqlalchemy.sql import func
 from core.db import Base
 
 class BillingModel(Base):
     __tablename__ = 'billings'
+    __table_args__ = (
+        # GIN-индекс под фильтры по клубам (clubs @> ARRAY[...] / clubs && ARRAY[...])
+        Index('ix_billings_clubs_gin', 'clubs', postgresql_using='gin'),
+        # Карты без списка клубов (доступны всем клубам) - эту ветку GIN-индекс не отвечает
+        Index('ix_billings_all_clubs', 'id', postgresql_where=text("clubs IS NULL")),
+    )
     id = Column(Integer, primary_key=True, index=True)
     billing_name = Column(String)
     tax_deposit = Column(Float, nullable=True)
@@ -29,4 +36,17 @@ class BillingModel(Base):
     card_balance = Column(Float, default=0)
     clubs = Column(ARRAY(Integer), nullable=True)
     bank = Column(String, nullable=True)
-    risk = Column(Boolean, default=False) # TODO: Добавить поле в бд для отметки карты как рисковая
\ No newline at end of file
+    risk = Column(Boolean, default=False) # TODO: Добавить поле в бд для отметки карты как рисковая
+
+
+def serves_club(club_id: int):
+    '''
+    Условие "карта обслуживает клуб": clubs IS NULL (все клубы) или club_id в clubs.
+    UNION ALL двух веток, каждая по своему индексу: OR в одном WHERE GIN-индекс целиком не покрывает
+    '''
+    return BillingModel.id.in_(
+        union_all(
+            select(BillingModel.id).where(BillingModel.clubs.is_(None)),
+            select(BillingModel.id).where(BillingModel.clubs.contains([club_id])),
+        )
+    )
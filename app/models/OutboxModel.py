@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, String, DateTime, Index, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func
+from core.db import Base
+
+class OutboxModel(Base):
+    '''Исходящие вызовы внешних API. Пишутся в одной транзакции с изменением, отправляются воркерами'''
+    __tablename__ = "outbox"
+    __table_args__ = (
+        Index('ix_outbox_ready', 'available_at', 'id', postgresql_where=text("status IN ('pending', 'inflight')")),
+        Index('ix_outbox_dead', 'id', postgresql_where=text("status = 'dead'")),
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    endpoint = Column(String, nullable=False) # Например settlement.create_order
+    payload = Column(JSONB, nullable=False)
+    status = Column(String, nullable=False, default="pending", server_default="pending") # pending, inflight, done, dead
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    last_error = Column(String, nullable=True)
+    result = Column(JSONB, nullable=True) # Ответ API после успешной отправки
+    created_at = Column(DateTime, server_default=func.now())
+    available_at = Column(DateTime, server_default=func.now()) # Не раньше этого времени (повтор после ошибки), для inflight - конец аренды
+    processed_at = Column(DateTime, nullable=True)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Enum as SAEnum, DateTime, String, Float, Boolean
+from sqlalchemy import Column, Integer, Enum as SAEnum, DateTime, String, Float, Boolean, Index
 from core.db import Base
 from sqlalchemy.sql import func
 from enum import Enum
@@ -21,10 +21,28 @@ class TransactionBonusModel(Base):
     status = Column(SAEnum(StatusEnum, name="status_enum"), nullable=False, default=StatusEnum.PENDING)
     
     data = Column(String, nullable=True)
-    created_at = Column(DateTime(timezone=False), server_default=func.now())
+    created_at = Column(DateTime(timezone=False), nullable=False, server_default=func.now()) # Ключ keyset-листинга, NULL не допускается
     updated_at = Column(DateTime(timezone=False), server_default=func.now(), server_onupdate=func.now())
     scheduled_at = Column(DateTime(timezone=False), server_default=func.now(), nullable=True)  # Добавленное поле для даты начисления
     is_send = Column(Boolean, nullable=True, default=False)
+    is_receipt = Column(Boolean, nullable=False, default=False, server_default="false") # Бонус за чек
 
     def __repr__(self):
-        return f"<BonusTransaction(id={self.id}, transaction_id={self.transaction_id}, bonus_id={self.bonus_id}, status='{self.status}')>"
\ No newline at end of file
+        return f"<BonusTransaction(id={self.id}, transaction_id={self.transaction_id}, bonus_id={self.bonus_id}, status='{self.status}')>"
+
+
+# Листинг бонусов: keyset по (created_at, id) от новых к старым, отдельный частичный индекс на каждое значение is_receipt
+Index(
+    'ix_transaction_bonuses_created',
+    TransactionBonusModel.created_at.desc(), TransactionBonusModel.id.desc(),
+)
+Index(
+    'ix_transaction_bonuses_receipt_created',
+    TransactionBonusModel.created_at.desc(), TransactionBonusModel.id.desc(),
+    postgresql_where=TransactionBonusModel.is_receipt,
+)
+Index(
+    'ix_transaction_bonuses_not_receipt_created',
+    TransactionBonusModel.created_at.desc(), TransactionBonusModel.id.desc(),
+    postgresql_where=~TransactionBonusModel.is_receipt,
+)
@@ -1,9 +1,12 @@
 from core.db import Base
 from sqlalchemy import Boolean, Column, Integer, String, DateTime
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 
 class UserModel(Base):
     __tablename__ = "users"
+    # Серверные значения по умолчанию не дочитываются через RETURNING: INSERT не упоминает token_version
+    __mapper_args__ = {"eager_defaults": False}
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String, unique=True, nullable=False)
     email = Column(String, nullable=False, unique=True, index=True)
@@ -20,6 +23,9 @@ class UserModel(Base):
     
     # Срок действия токенов
     token_expires = Column(DateTime, nullable=True)
+    # Версия токенов: увеличение отзывает все выданные access-токены с ролями.
+    # Отложенная колонка: читается только при ACCESS_TOKEN_ROLE_CLAIMS, без флага код работает и до миграции
+    token_version = deferred(Column(Integer, nullable=False, server_default="0"))
     
     # Полезно добавить временные метки
     created_at = Column(DateTime, server_default=func.now(), nullable=True)
@@ -0,0 +1,43 @@
+from sqlalchemy import Column, Integer, String, DateTime, Index, UniqueConstraint, PrimaryKeyConstraint, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func
+from core.db import Base
+
+class WebhookEventModel(Base):
+    '''Входящие колбэки провайдеров. Пишутся одним INSERT, обрабатываются фоновыми воркерами'''
+    __tablename__ = "webhook_events"
+    __table_args__ = (
+        # Повторная отправка того же статуса провайдером не создаёт второе событие. NULLS NOT DISTINCT (PostgreSQL 15+):
+        # колбэк без статуса (event_status NULL) тоже дедуплицируется, а не считается каждый раз новым
+        UniqueConstraint(
+            'provider', 'external_id', 'event_status',
+            name='uq_webhook_events_dedup', postgresql_nulls_not_distinct=True,
+        ),
+        # Очередь: воркеры выбирают только pending, индекс остаётся маленьким
+        Index('ix_webhook_events_pending', 'available_at', 'id', postgresql_where=text("status = 'pending'")),
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    provider = Column(String, nullable=False)
+    external_id = Column(String, nullable=True) # ID платежа у провайдера
+    event_status = Column(String, nullable=True) # Статус платежа из колбэка
+    payload = Column(JSONB, nullable=False)
+    source = Column(String, nullable=False, default="callback", server_default="callback") # callback, poll
+    status = Column(String, nullable=False, default="pending", server_default="pending") # pending, done, skipped, failed
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    last_error = Column(String, nullable=True)
+    received_at = Column(DateTime, server_default=func.now())
+    available_at = Column(DateTime, server_default=func.now()) # Не раньше этого времени (повтор после ошибки)
+    processed_at = Column(DateTime, nullable=True)
+
+
+class WebhookPaymentStateModel(Base):
+    '''Последний применённый статус платежа. Строка блокируется на время обработки события'''
+    __tablename__ = "webhook_payment_states"
+    __table_args__ = (
+        PrimaryKeyConstraint('provider', 'external_id'),
+    )
+    provider = Column(String, nullable=False)
+    external_id = Column(String, nullable=False)
+    status = Column(String, nullable=True)
+    event_id = Column(Integer, nullable=True) # Событие, которым применён статус
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
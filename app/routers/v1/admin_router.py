@@ -0,0 +1,114 @@
+from typing import Optional
+
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.db import get_session
+from dependencies.auth import get_admin_user
+from utils.loop_lag import loop_lag_monitor
+from utils.outbox import outbox_dispatcher
+from utils.profiling import continuous_profiler, profile_store
+from utils.slow_queries import slow_query_log
+
+router = APIRouter(prefix="/admin", tags=["Администрирование"], dependencies=[Depends(get_admin_user)])
+
+
+@router.get("/slow-queries")
+async def get_slow_queries(limit: Optional[int] = Query(None, ge=1)):
+    '''Медленные запросы к БД по убыванию максимального времени, с планом EXPLAIN если он снят'''
+    return {
+        "threshold_ms": slow_query_log.threshold_ms,
+        "items": slow_query_log.snapshot(limit),
+    }
+
+
+@router.delete("/slow-queries")
+async def clear_slow_queries():
+    slow_query_log.clear()
+    return {"detail": "ok"}
+
+
+@router.get("/loop-blocks")
+async def get_loop_blocks(stacks: int = Query(3, ge=1, le=20)):
+    '''Места в коде, блокировавшие event loop дольше LOOP_BLOCK_THRESHOLD'''
+    return loop_lag_monitor.block_report(stacks)
+
+
+@router.get("/profiling")
+async def get_profiling_status():
+    return {
+        "running": continuous_profiler.running,
+        "started_at": continuous_profiler.started_at,
+        "interval": continuous_profiler.interval,
+        "stacks": len(continuous_profiler.samples),
+    }
+
+
+@router.post("/profiling/start")
+async def start_profiling():
+    '''Включает непрерывный профайлер. Накопленные стеки сбрасываются'''
+    continuous_profiler.reset()
+    continuous_profiler.start()
+    return {"detail": "ok"}
+
+
+@router.post("/profiling/stop")
+async def stop_profiling():
+    await asyncio.to_thread(continuous_profiler.stop)
+    return {"detail": "ok"}
+
+
+@router.post("/profiling/dump")
+async def dump_profiling():
+    '''Сохраняет накопленные стеки в файл (collapsed-формат для flamegraph.pl / speedscope)'''
+    name = profile_store.new_name("continuous")
+    await asyncio.to_thread(profile_store.save, name, continuous_profiler.collapsed())
+    return {"name": name}
+
+
+@router.get("/profiles")
+async def get_profiles():
+    return await asyncio.to_thread(profile_store.list)
+
+
+@router.get("/profiles/{name}")
+async def download_profile(name: str):
+    path = profile_store.path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=name)
+
+
+@router.get("/outbox/dead")
+async def get_outbox_dead_letters(
+    endpoint: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    session: AsyncSession = Depends(get_session),
+):
+    '''Сообщения outbox, исчерпавшие попытки отправки'''
+    messages = await outbox_dispatcher.dead_letters(session, endpoint, limit)
+    return [
+        {
+            "id": m.id,
+            "endpoint": m.endpoint,
+            "payload": m.payload,
+            "attempts": m.attempts,
+            "last_error": m.last_error,
+            "created_at": m.created_at,
+            "processed_at": m.processed_at,
+        }
+        for m in messages
+    ]
+
+
+@router.post("/outbox/dead/retry")
+async def retry_outbox_dead_letters(
+    ids: Optional[list[int]] = Query(None),
+    endpoint: Optional[str] = None,
+    session: AsyncSession = Depends(get_session),
+):
+    '''Вернуть dead-сообщения в очередь. Без ids и endpoint - все'''
+    return {"retried": await outbox_dispatcher.retry(session, ids, endpoint)}
@@ -1,14 +1,16 @@
-from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError, jwt
 
 from core.db import get_session
 from dependencies.auth import (
-    authenticate_user, create_access_token, create_refresh_token,
-    get_password_hash, get_user_by_email, get_user_by_username, update_user_token
+    access_token_claims, authenticate_user, create_access_token, create_refresh_token,
+    get_password_hash_async, token_claim_columns, update_user_token
 )
+from dependencies.rate_limit import check_login_rate_limit
 from core.config import settings
 from models.UserModel import UserModel
 from schemas.auth import Token, TokenPayload, UserCreate, UserLogin, RefreshToken
@@ -18,43 +20,46 @@ router = APIRouter(prefix="/auth", tags=["Аутентификация"])
 @router.post("/register", response_model=Token)
 async def register_user(user_data: UserCreate, session: AsyncSession = Depends(get_session)):
     # Проверка существования пользователя
-    db_user = await get_user_by_email(session, email=user_data.email)
-    if db_user:
+    result = await session.execute(
+        select(UserModel.id).where(UserModel.email == user_data.email)
+    )
+    if result.first():
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email уже зарегистрирован"
         )
     
-    # Создание нового пользователя
-    hashed_password = get_password_hash(user_data.password)
+    # Создание токенов: username совпадает с email, поэтому токены готовы до вставки.
+    # id ещё нет, поэтому здесь токен без ролей - роли проверятся через БД
+    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = create_access_token(
+        data={"sub": user_data.email}, expires_delta=access_token_expires
+    )
+    refresh_token = create_refresh_token(data={"sub": user_data.email})
+
+    # Создание нового пользователя сразу с токеном - один INSERT без refresh
+    hashed_password = await get_password_hash_async(user_data.password)
     db_user = UserModel(
         username=user_data.email,
         email=user_data.email,
         hashed_password=hashed_password,
-        is_client=True  # По умолчанию создаем клиента
+        is_client=True,  # По умолчанию создаем клиента
+        access_token=access_token,
+        token_expires=datetime.utcnow() + access_token_expires
     )
     
     session.add(db_user)
     await session.commit()
-    await session.refresh(db_user)
-    
-    # Создание токенов
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": db_user.username}, expires_delta=access_token_expires
-    )
-    refresh_token = create_refresh_token(data={"sub": db_user.username})
-    
-    # Обновление токена в базе
-    await update_user_token(session, db_user, access_token)
     
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
 @router.post("/token", response_model=Token)
 async def login_for_access_token(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
     session: AsyncSession = Depends(get_session)
 ):
+    await check_login_rate_limit(request, form_data.username, session)
     user = await authenticate_user(session, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
@@ -65,21 +70,23 @@ async def login_for_access_token(
     
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data=access_token_claims(user), expires_delta=access_token_expires
     )
     refresh_token = create_refresh_token(data={"sub": user.username})
     
     # Обновление токена в базе
-    await update_user_token(session, user, access_token)
+    await update_user_token(session, user.id, access_token)
     
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
 
 @router.post("/login", response_model=Token)
 async def login_for_access_token_json(
+    request: Request,
     user_data: UserLogin,
     session: AsyncSession = Depends(get_session)
 ):
+    await check_login_rate_limit(request, user_data.username, session)
     user = await authenticate_user(session, user_data.username, user_data.password)
     if not user:
         raise HTTPException(
@@ -90,12 +97,12 @@ async def login_for_access_token_json(
     
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data=access_token_claims(user), expires_delta=access_token_expires
     )
     refresh_token = create_refresh_token(data={"sub": user.username})
     
     # Обновление токена в базе
-    await update_user_token(session, user, access_token)
+    await update_user_token(session, user.id, access_token)
     
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
@@ -123,7 +130,10 @@ async def refresh_token(
             detail="Недействительный токен обновления"
         )
         
-    user = await get_user_by_username(session, username=username)
+    result = await session.execute(
+        select(*token_claim_columns()).where(UserModel.username == username)
+    )
+    user = result.first()
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -132,10 +142,10 @@ async def refresh_token(
     
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data=access_token_claims(user), expires_delta=access_token_expires
     )
     
     # Обновление токена в базе
-    await update_user_token(session, user, access_token)
+    await update_user_token(session, user.id, access_token)
     
     return {"access_token": access_token, "refresh_token": token_data.refresh_token, "token_type": "bearer"}
\ No newline at end of file
@@ -1,14 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, Request, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from dependencies.auth import get_session
-from models.BIllingModel import BillingModel
+from models.BIllingModel import BillingModel, serves_club
 from utils.crud import CRUDBase
-from schemas.Billing import Filters, Billing, BillingCreate, BillingAllRequest, BillingResponse
+from schemas.Billing import Filters, Billing, BillingCreate, BillingAllRequest, BillingResponse, FilterCondition
 from typing import Optional
 import json
 from typing import Any
 from typing import List
 from sqlalchemy import select, func
+from utils.fx_rates import fx_rates, convert_to_usd
 
 router = APIRouter(prefix="/billing", tags=["billing"])
 
@@ -47,24 +48,39 @@ async def get_all_billings(
 ) -> Any:
     offset = (data.page - 1) * data.limit
 
+    filters = list(data.filters or [])
+    # Те же правила, что при выборе реквизитов: карта без списка клубов обслуживает все клубы
+    where = [serves_club(data.club_id)] if data.club_id is not None else []
+
     query = select(func.count()).select_from(BillingModel)
-    query = crud_service.apply_filters(query, data.filters)
+    query = crud_service.apply_filters(query, filters).where(*where)
     result = await db.execute(query)
     total_count = result.scalar_one()
 
     # Получаем записи, передавая order_by напрямую
     result = await crud_service.get_multi(
         db,
-        filter_list=data.filters,
+        filter_list=filters,
         offset=offset,
         limit=data.limit,
-        order_by=data.order_by  # Передаем order_by напрямую
+        order_by=data.order_by,  # Передаем order_by напрямую
+        where=where
     )
 
     total_pages = (total_count + data.limit - 1) // data.limit
 
+    # Один снимок курсов на всю страницу
+    rates = fx_rates.snapshot()
+    billings = []
+    for row in result:
+        billing = Billing.model_validate(row)
+        billing.card_balance_usd = convert_to_usd(
+            billing.card_balance, rates.get((billing.billing_currency or "").upper())
+        )
+        billings.append(billing)
+
     return BillingResponse(
-        data=result,
+        data=billings,
         page=data.page,
         tot_pages=total_pages,
         total_items=total_count,
@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, Response
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from utils.crud import CRUDBase
+from utils.cache import TTLCache
 from models.TransactionBonusModel import TransactionBonusModel
 from schemas.transaction_bonus import TransactionBonus
-from sqlalchemy import select, func
+from sqlalchemy import select, func, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
+from core.config import settings
 from core.db import get_session
 from typing import Optional
 
@@ -12,35 +16,81 @@ router = APIRouter(prefix="/client-bonus", tags=["Бонусы"])
 CRUDTransfer = CRUDBase[TransactionBonusModel, TransactionBonus, TransactionBonus]
 crud_transfer = CRUDTransfer(TransactionBonusModel)
 
+# Количество записей по фильтру: ключ - значение is_receipt (None - без фильтра)
+bonus_count_cache = TTLCache(maxsize=16, ttl=settings.BONUS_COUNT_CACHE_TTL)
+
+
+def encode_bonus_cursor(bonus: TransactionBonusModel) -> str:
+    return f"{bonus.created_at.isoformat()}_{bonus.id}"
+
+
+def decode_bonus_cursor(cursor: str) -> tuple[datetime, int]:
+    created_at, _, bonus_id = cursor.rpartition("_")
+    try:
+        return datetime.fromisoformat(created_at), int(bonus_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+
+def receipt_filter(is_receipt: bool):
+    # Условие буквально совпадает с предикатом частичного индекса - планировщик выберет его и при bind-параметрах
+    return TransactionBonusModel.is_receipt if is_receipt else ~TransactionBonusModel.is_receipt
+
+
+async def count_bonuses(db: AsyncSession, is_receipt: Optional[bool]) -> int:
+    total_items = bonus_count_cache.get(is_receipt)
+    if total_items is None:
+        stmt = select(func.count()).select_from(TransactionBonusModel)
+        if is_receipt is not None:
+            stmt = stmt.where(receipt_filter(is_receipt))
+        total_items = (await db.execute(stmt)).scalar_one()
+        bonus_count_cache.set(is_receipt, total_items)
+    return total_items
+
 
 @router.get("/all")
 async def get_client_bonus(
-        page: int = 1,
-        limit: int = 100,
+        response: Response,
+        page: int = Query(1, ge=1),
+        limit: int = Query(100, ge=1, le=1000),
         is_receipt: Optional[bool] = None,
+        cursor: Optional[str] = None,
         db: AsyncSession = Depends(get_session)
     ):
+    '''
+    Бонусы от новых к старым.
+    cursor - курсор из X-Next-Cursor (next_cursor) предыдущей страницы: страница берётся по индексу
+    (created_at, id) без OFFSET. page оставлен для совместимости и работает только без cursor.
+    total_items считается с тем же фильтром и кэшируется на BONUS_COUNT_CACHE_TTL секунд
+    '''
     stmt = select(TransactionBonusModel)
     if is_receipt is not None:
-        stmt = stmt.where(TransactionBonusModel.is_receipt == is_receipt)
-    stmt = stmt.order_by(TransactionBonusModel.created_at.desc())
-    stmt = stmt.offset((page - 1) * limit).limit(limit) # 127, 128, 129, 130
+        stmt = stmt.where(receipt_filter(is_receipt))
+    stmt = stmt.order_by(TransactionBonusModel.created_at.desc(), TransactionBonusModel.id.desc()).limit(limit)
+    if cursor is not None:
+        stmt = stmt.where(
+            tuple_(TransactionBonusModel.created_at, TransactionBonusModel.id) < tuple_(*decode_bonus_cursor(cursor))
+        )
+    else:
+        stmt = stmt.offset((page - 1) * limit)
     result = await db.execute(stmt)
-    receipts = result.scalars().all()
+    bonuses = result.scalars().all()
+
+    next_cursor = None
+    if bonuses and len(bonuses) == limit:
+        next_cursor = encode_bonus_cursor(bonuses[-1])
+        response.headers["X-Next-Cursor"] = next_cursor
 
-    # Пагинация и сортировка нужно получить количество записе (total_items) и высчитать количество страниц (tot_pages)
-    stmt_count = select(TransactionBonusModel)
-    count = select(func.count()).select_from(stmt_count)
-    count_rows = await db.execute(count)
-    total_items = count_rows.scalar_one()
+    total_items = await count_bonuses(db, is_receipt)
     tot_pages = (total_items + limit - 1) // limit
 
     return {
-        "data": [TransactionBonus.model_validate(receipt.__dict__) for receipt in receipts],
+        "data": [TransactionBonus.model_validate(bonus) for bonus in bonuses],
         "page": page,
         "tot_pages": tot_pages,
         "total_items": total_items,
-        "limit": limit
+        "limit": limit,
+        "next_cursor": next_cursor
     }
 
 
@@ -5,7 +5,8 @@ from typing import Optional
 from pydantic import BaseModel
 
 from core.db import get_session
-from models.BIllingModel import BillingModel
+from models.BIllingModel import BillingModel, serves_club
+from utils.fx_rates import fx_rates, convert_to_usd
 
 router = APIRouter(prefix="/payment", tags=["Платежи"])
 
@@ -29,8 +30,8 @@ class PaymentRequisites(BaseModel):
     currency: str # валюта
     billing_id: int # id биллинга
     billing_status: str # статус биллинга исторично сложилось что может быть UUID
-    billing_usd: float # сумма в долларах
-    currency_rate: float # курс валюты
+    billing_usd: Optional[float] = None # сумма в долларах, None если курса нет или он устарел
+    currency_rate: Optional[float] = None # курс валюты (единиц валюты за 1 USD)
 
 
 @router.post("/requisites", response_model=PaymentRequisites)
@@ -47,7 +48,9 @@ async def get_payment_requisites(
         BillingModel.billing_currency == payment_data.currency,
         BillingModel.soft_delete == False,
         BillingModel.min_amount <= payment_data.amount,
-        BillingModel.max_amount >= payment_data.amount
+        BillingModel.max_amount >= payment_data.amount,
+        # Карта без списка клубов доступна всем клубам, как и до фильтра
+        serves_club(payment_data.club_id)
     ).order_by(BillingModel.sort_id)
     
     result = await session.execute(query)
@@ -59,11 +62,15 @@ async def get_payment_requisites(
             detail=f"Нет доступных реквизитов для валюты {payment_data.currency} и суммы {payment_data.amount}"
         )
     
+    currency_rate = fx_rates.get_rate(payment_data.currency)
+
     return PaymentRequisites(
         card_number=billing.card,
         card_details=billing.card_details,
         bank=billing.bank,
         amount=payment_data.amount,
         currency=payment_data.currency,
-        billing_id=billing.id
+        billing_id=billing.id,
+        billing_usd=convert_to_usd(payment_data.amount, currency_rate),
+        currency_rate=currency_rate
     )
@@ -1,55 +1,88 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from typing import List
+from typing import List, Optional
 
 from core.db import get_session
-from dependencies.auth import get_admin_user, get_current_user, get_password_hash
+from dependencies.auth import get_admin_user, get_current_user, get_password_hash_async, invalidate_user_principals, revoke_user_tokens
 from models.UserModel import UserModel
 from schemas.user import User, UserUpdate, UserCreate, UserInDB
+from schemas.auth import Principal
 
 router = APIRouter(prefix="/users", tags=["Пользователи"])
 
 @router.get("/me", response_model=User)
-async def read_users_me(current_user: UserModel = Depends(get_current_user)):
+async def read_users_me(current_user: Principal = Depends(get_current_user)):
     return current_user
 
 @router.put("/me", response_model=User)
 async def update_user_me(
     user_data: UserUpdate,
-    current_user: UserModel = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     session: AsyncSession = Depends(get_session)
 ):
+    db_user = await session.get(UserModel, current_user.id)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+
     # Обновление данных текущего пользователя
     if user_data.username is not None:
-        current_user.username = user_data.username
+        db_user.username = user_data.username
     if user_data.email is not None:
-        current_user.email = user_data.email
+        db_user.email = user_data.email
     if user_data.password is not None:
-        current_user.hashed_password = get_password_hash(user_data.password)
+        db_user.hashed_password = await get_password_hash_async(user_data.password)
+        # Смена пароля отзывает выданные токены
+        revoke_user_tokens(db_user)
     
-    session.add(current_user)
+    session.add(db_user)
     await session.commit()
-    await session.refresh(current_user)
-    return current_user
+    await session.refresh(db_user)
+    invalidate_user_principals(db_user.id)
+    return db_user
+
+# Публичные поля пользователя: hashed_password и токены не читаются из БД
+USER_PUBLIC_COLUMNS = (
+    UserModel.id,
+    UserModel.username,
+    UserModel.email,
+    UserModel.is_admin,
+    UserModel.is_client,
+    UserModel.is_operator,
+    UserModel.is_cashier,
+)
 
 @router.get("/", response_model=List[User])
 async def read_users(
-    skip: int = 0, 
-    limit: int = 100, 
-    current_user: UserModel = Depends(get_admin_user),
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    after_id: Optional[int] = None,
+    current_user: Principal = Depends(get_admin_user),
     session: AsyncSession = Depends(get_session)
 ):
-    result = await session.execute(
-        select(UserModel).offset(skip).limit(limit)
-    )
-    users = result.scalars().all()
+    '''
+    Список пользователей по id.
+    after_id - курсор (id последнего пользователя предыдущей страницы), страница берётся
+    по индексу без OFFSET. Курсор следующей страницы отдаётся в заголовке X-Next-Cursor.
+    skip оставлен для совместимости и работает только без after_id
+    '''
+    query = select(*USER_PUBLIC_COLUMNS).order_by(UserModel.id).limit(limit)
+    if after_id is not None:
+        query = query.where(UserModel.id > after_id)
+    else:
+        query = query.offset(skip)
+
+    result = await session.execute(query)
+    users = [dict(row._mapping) for row in result]
+    if users and len(users) == limit:
+        response.headers["X-Next-Cursor"] = str(users[-1]["id"])
     return users
 
 @router.post("/", response_model=User)
 async def create_user(
     user_data: UserCreate,
-    current_user: UserModel = Depends(get_admin_user),
+    current_user: Principal = Depends(get_admin_user),
     session: AsyncSession = Depends(get_session)
 ):
     # Проверка существования пользователя
@@ -64,7 +97,7 @@ async def create_user(
         )
     
     # Создание нового пользователя
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash_async(user_data.password)
     db_user = UserModel(
         username=user_data.username,
         email=user_data.email,
@@ -83,7 +116,7 @@ async def create_user(
 @router.get("/{user_id}", response_model=User)
 async def read_user(
     user_id: int,
-    current_user: UserModel = Depends(get_admin_user),
+    current_user: Principal = Depends(get_admin_user),
     session: AsyncSession = Depends(get_session)
 ):
     result = await session.execute(
@@ -98,7 +131,7 @@ async def read_user(
 async def update_user(
     user_id: int,
     user_data: UserUpdate,
-    current_user: UserModel = Depends(get_admin_user),
+    current_user: Principal = Depends(get_admin_user),
     session: AsyncSession = Depends(get_session)
 ):
     result = await session.execute(
@@ -114,7 +147,7 @@ async def update_user(
     if user_data.email is not None:
         db_user.email = user_data.email
     if user_data.password is not None:
-        db_user.hashed_password = get_password_hash(user_data.password)
+        db_user.hashed_password = await get_password_hash_async(user_data.password)
     if user_data.is_admin is not None:
         db_user.is_admin = user_data.is_admin
     if user_data.is_client is not None:
@@ -123,16 +156,19 @@ async def update_user(
         db_user.is_operator = user_data.is_operator
     if user_data.is_cashier is not None:
         db_user.is_cashier = user_data.is_cashier
+    # Роли в выданных токенах могли устареть - отзываем их
+    revoke_user_tokens(db_user)
     
     session.add(db_user)
     await session.commit()
     await session.refresh(db_user)
+    invalidate_user_principals(db_user.id)
     return db_user
 
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user(
     user_id: int,
-    current_user: UserModel = Depends(get_admin_user),
+    current_user: Principal = Depends(get_admin_user),
     session: AsyncSession = Depends(get_session)
 ):
     result = await session.execute(
@@ -144,4 +180,5 @@ async def delete_user(
     
     await session.delete(db_user)
     await session.commit()
+    invalidate_user_principals(user_id)
     return {"status": "success"}
\ No newline at end of file
@@ -0,0 +1,43 @@
+import json
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.db import get_session
+from utils.client_ip import client_ip as resolve_client_ip
+from utils.webhooks import WEBHOOK_PARSERS, WebhookAuthError, WebhookPayloadError, ingest_webhook, verify_webhook, webhook_workers
+
+logger = logging.getLogger("app.webhooks")
+
+router = APIRouter(prefix="/webhook", tags=["webhook"])
+
+
+@router.post("/{provider}")
+async def receive_webhook(provider: str, request: Request, session: AsyncSession = Depends(get_session)):
+    '''Колбэк провайдера: проверка отправителя и тела, один INSERT и сразу 200. Обработка - в фоновых воркерах'''
+    if provider not in WEBHOOK_PARSERS:
+        raise HTTPException(status_code=404, detail="Unknown provider")
+    if not webhook_workers.handles(provider):
+        # Без обработчика событие навсегда осталось бы pending, а провайдер получил бы 200 и не повторил
+        raise HTTPException(status_code=503, detail="Webhook processing is not available")
+    body = await request.body()
+    # Адрес клиента, а не прокси перед приложением (TRUSTED_PROXIES)
+    client_ip = resolve_client_ip(request)
+    try:
+        verify_webhook(provider, body, request.headers, request.query_params, client_ip)
+    except WebhookAuthError as e:
+        logger.warning("Rejected %s webhook from %s: %s", provider, client_ip, e.detail)
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+    try:
+        event_id = await ingest_webhook(session, provider, payload)
+    except WebhookPayloadError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if event_id is None:
+        # Повтор уже принятого колбэка - провайдеру всё равно отвечаем 200
+        return {"status": "ok", "duplicate": True}
+    return {"status": "ok", "id": event_id}
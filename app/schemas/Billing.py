@@ -58,6 +58,7 @@ class Billing(BaseModel):
     card_balance: float = 0
     clubs: Optional[set[int]] = None
     bank: Optional[str] = None
+    card_balance_usd: Optional[float] = None # считается по текущему курсу, в БД не хранится
 
     class Config:
         from_attributes = True
@@ -80,13 +81,15 @@ class FilterCondition(BaseModel):
     field: str
     op: Literal[
         'eq', 'ne', 'lt', 'lte', 'gt', 'gte', 
-        'in', 'not_in', 'like', 'between', 'is_null'
+        'in', 'not_in', 'like', 'between', 'is_null',
+        'contains', 'overlaps'
     ]
     value: Any
 
 
 class BillingAllRequest(BaseModel):
     filters: Optional[List[FilterCondition]] = []
+    club_id: Optional[int] = None # Только биллинги, привязанные к клубу
     order_by: Optional[List[str]] = Field(default_factory=list, example=["-created_at"])
     page: int = 1       # Номер страницы для пагинации (необязательный параметр)
     limit: int = 100    # Размер страницы (количество записей)
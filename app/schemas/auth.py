@@ -39,6 +39,20 @@ class Token(BaseModel):
     refresh_token: str
     token_type: str = "bearer"
 
+# Аутентифицированный пользователь: то, что нужно для авторизации, без строки из БД
+class Principal(BaseModel):
+    id: int
+    username: str
+    email: Optional[str] = None
+    is_admin: Optional[bool] = False
+    is_client: Optional[bool] = False
+    is_operator: Optional[bool] = False
+    is_cashier: Optional[bool] = False
+
+    class Config:
+        from_attributes = True
+        frozen = True
+
 class TokenPayload(BaseModel):
     sub: Optional[str] = None
     exp: Optional[int] = None
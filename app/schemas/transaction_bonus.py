@@ -20,6 +20,7 @@ class TransactionBonus(BaseModel):
     updated_at: datetime = Field(default_factory=datetime.now)
     scheduled_at: Optional[datetime] = Field(default_factory=datetime.now)
     is_send: Optional[bool] = False
+    is_receipt: bool = False
 
     class Config:
-        model_validate = True
\ No newline at end of file
+        from_attributes = True
\ No newline at end of file
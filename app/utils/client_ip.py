@@ -0,0 +1,38 @@
+import ipaddress
+from typing import Optional
+
+from fastapi import Request
+
+from core.config import settings
+
+
+def parse_networks(value: str) -> list:
+    '''"127.0.0.0/8,10.0.0.1" -> [IPv4Network("127.0.0.0/8"), IPv4Network("10.0.0.1/32")]'''
+    return [ipaddress.ip_network(item.strip(), strict=False) for item in value.split(",") if item.strip()]
+
+
+_trusted_proxies = parse_networks(settings.TRUSTED_PROXIES)
+
+
+def _is_trusted(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in _trusted_proxies)
+
+
+def client_ip(request: Request) -> Optional[str]:
+    '''
+    Адрес клиента за прокси. Если соединение пришло от доверенного прокси (TRUSTED_PROXIES),
+    X-Forwarded-For читается справа налево до первого недоверенного адреса: левые части
+    заголовка клиент может подставить сам. Без доверенного прокси - адрес соединения.
+    '''
+    peer = request.client.host if request.client else None
+    if peer is None or not _is_trusted(peer):
+        return peer
+    forwarded = [item.strip() for item in request.headers.get("x-forwarded-for", "").split(",") if item.strip()]
+    for address in reversed(forwarded):
+        if not _is_trusted(address):
+            return address
+    return forwarded[0] if forwarded else peer
@@ -1,7 +1,7 @@
 from typing import Any, Dict, Generic, List, Optional, Type, TypeVar, Union, Literal
 from datetime import datetime
 from pydantic import BaseModel
-from sqlalchemy import select, func, update
+from sqlalchemy import select, func, update, ARRAY
 from sqlalchemy.ext.asyncio import AsyncSession
 
 ModelType = TypeVar("ModelType")
@@ -13,7 +13,8 @@ class FilterCondition(BaseModel):
     field: str
     op: Literal[
         'eq', 'ne', 'lt', 'lte', 'gt', 'gte', 
-        'in', 'not_in', 'like', 'between', 'is_null'
+        'in', 'not_in', 'like', 'between', 'is_null',
+        'contains', 'overlaps'
     ]
     value: Any
     
@@ -84,6 +85,16 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
                     query = query.filter(column.is_(None))
                 elif value is False:
                     query = query.filter(column.is_not(None))
+            elif op in ("contains", "overlaps"):
+                # Только для ARRAY-колонок: contains -> @>, overlaps -> &&. Для остальных условие пропускается
+                if not isinstance(column.type, ARRAY):
+                    continue
+                if not isinstance(value, (list, tuple, set)):
+                    value = [value]
+                if op == "contains":
+                    query = query.filter(column.contains(list(value)))
+                else:
+                    query = query.filter(column.overlap(list(value)))
 
         return query
 
@@ -142,10 +153,14 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         self, session: AsyncSession, 
         filter_list: Optional[List[FilterCondition]] = None, 
         offset: int = 0, limit: int = 90000, 
-        order_by: Optional[list] = None
+        order_by: Optional[list] = None,
+        where: Optional[list] = None
     ) -> List[ModelType]:
         query = select(self._model)
         query = self.apply_filters(query, filter_list)
+        if where:
+            # Условия, которые не выразить через FilterCondition
+            query = query.where(*where)
         query = self.apply_order_by(query, order_by)
         
         result = await session.execute(
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+import requests
+
+from core.config import settings
+
+logger = logging.getLogger("app")
+
+
+class FxRateService:
+    '''
+    Курсы валют к USD в памяти процесса.
+    Курс хранится как количество единиц валюты за 1 USD (как curse у Bitconce и rate у PayPort).
+    Источники: ответы провайдеров (observe) и фоновое обновление из FX_RATES_URL.
+    Курс старше max_age считается неизвестным, чтобы не считать суммы по протухшим данным.
+    '''
+
+    def __init__(
+        self,
+        currencies: list[str],
+        max_age: float,
+        source_url: Optional[str] = None,
+        refresh_interval: float = 300,
+    ) -> None:
+        self._currencies = {currency.upper() for currency in currencies}
+        self._max_age = max_age
+        self._source_url = source_url
+        self._refresh_interval = refresh_interval
+        # currency -> (rate, monotonic-время обновления, источник)
+        self._rates: dict[str, tuple[float, float, str]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def observe(self, currency: Optional[str], rate, source: str) -> None:
+        '''Запоминает курс из ответа провайдера. Мусорные значения молча игнорируются'''
+        if not currency:
+            return
+        currency = currency.upper()
+        if currency not in self._currencies:
+            return
+        try:
+            rate = float(rate)
+        except (TypeError, ValueError):
+            return
+        if rate <= 0:
+            return
+        self._rates[currency] = (rate, time.monotonic(), source)
+
+    def get_rate(self, currency: Optional[str]) -> Optional[float]:
+        if not currency:
+            return None
+        currency = currency.upper()
+        if currency in ("USD", "USDT"):
+            return 1.0
+        item = self._rates.get(currency)
+        if item is None or time.monotonic() - item[1] > self._max_age:
+            return None
+        return item[0]
+
+    def snapshot(self) -> dict[str, float]:
+        '''Свежие курсы одним словарём - для массовых пересчётов без поиска на каждую строку'''
+        now = time.monotonic()
+        rates = {
+            currency: rate
+            for currency, (rate, updated_at, _) in list(self._rates.items())
+            if now - updated_at <= self._max_age
+        }
+        rates["USD"] = rates["USDT"] = 1.0
+        return rates
+
+    def to_usd(self, amount: Optional[float], currency: Optional[str]) -> Optional[float]:
+        return convert_to_usd(amount, self.get_rate(currency))
+
+    async def refresh(self) -> None:
+        '''Забирает курсы из FX_RATES_URL. Ожидается JSON {"KZT": 480.5, ...} или {"rates": {...}}'''
+        if not self._source_url:
+            return
+        response = await asyncio.to_thread(requests.get, self._source_url, timeout=10)
+        response.raise_for_status()
+        data = response.json()
+        rates = data.get("rates", data)
+        for currency, rate in rates.items():
+            self.observe(currency, rate, "source")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning("FX rates refresh failed: %s", e)
+            await asyncio.sleep(self._refresh_interval)
+
+    def start(self) -> None:
+        if self._source_url and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def convert_to_usd(amount: Optional[float], rate: Optional[float]) -> Optional[float]:
+    if amount is None or not rate:
+        return None
+    return round(amount / rate, 2)
+
+
+fx_rates = FxRateService(
+    currencies=settings.FX_RATES_CURRENCIES,
+    max_age=settings.FX_RATES_MAX_AGE,
+    source_url=settings.FX_RATES_URL,
+    refresh_interval=settings.FX_RATES_REFRESH_INTERVAL,
+)
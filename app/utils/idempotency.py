@@ -0,0 +1,77 @@
+import functools
+import inspect
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable
+
+from utils.cache import MISSING, TTLCache
+
+
+class RequestCoalescer:
+    '''
+    Идемпотентность вызовов по ключу.
+    Параллельные дубликаты ждут результат уже выполняющегося вызова,
+    завершённые результаты отдаются из TTL-кэша. Ошибки не кэшируются,
+    поэтому повтор после неудачи снова идёт в провайдера.
+    '''
+
+    def __init__(self, ttl: float, maxsize: int = 10000) -> None:
+        self._results = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._inflight: dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def run(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        result = self._results.get(key, MISSING)
+        if result is not MISSING:
+            return result
+
+        with self._lock:
+            # Повторная проверка под локом: вызов мог завершиться, пока ждали
+            result = self._results.get(key, MISSING)
+            if result is not MISSING:
+                return result
+            future = self._inflight.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._inflight[key] = future
+
+        if not is_owner:
+            return future.result()
+
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            self._results.set(key, result)
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def by_key(self, arg_name: str, *extra_args: str):
+        '''
+        Декоратор: ключ - функция, аргумент arg_name и extra_args (всё, от чего зависит результат:
+        повтор с другой суммой не должен получить старый ответ). Если arg_name равен None - вызов идёт без кэша
+        '''
+        def decorator(func):
+            signature = inspect.signature(func)
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                key = bound.arguments.get(arg_name)
+                if key is None:
+                    return func(*args, **kwargs)
+                key = (func.__qualname__, str(key), *(str(bound.arguments.get(name)) for name in extra_args))
+                return self.run(key, lambda: func(*args, **kwargs))
+            return wrapper
+        return decorator
+
+    def forget(self, key: Hashable) -> int:
+        '''Сбросить сохранённые результаты по значению arg_name (например, transaction_id) для всех параметров'''
+        return self._results.pop_where(lambda cached, _: cached[1] == str(key))
@@ -0,0 +1,74 @@
+'''
+Проверка времени холодного импорта приложения.
+
+    python -m utils.import_budget [--module main] [--budget-ms 2000] [--runs 3]
+
+Импорт выполняется в отдельном процессе (холодный старт, как у нового воркера)
+несколько раз, берётся лучший результат. Если он больше бюджета - код выхода 1.
+Запускается при сборке образа (Dockerfile), поэтому превышение бюджета роняет сборку.
+Печатаются самые тяжёлые модули по данным python -X importtime.
+'''
+import argparse
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from core.config import settings
+
+APP_DIR = Path(__file__).resolve().parent.parent
+
+
+def measure(module: str) -> tuple[float, str]:
+    '''Время импорта module в новом процессе (мс) и вывод -X importtime'''
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=APP_DIR,
+        capture_output=True,
+        text=True,
+    )
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    return elapsed_ms, result.stderr
+
+
+def heaviest_imports(importtime_output: str, top: int = 15) -> list[tuple[int, str]]:
+    '''(кумулятивное время в мкс, модуль) из вывода -X importtime, по убыванию'''
+    rows = []
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time:   self [us] | cumulative | imported package"
+        _, cumulative_us, name = line.split(":", 1)[1].split("|", 2)
+        rows.append((int(cumulative_us), name.strip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Import-time budget check")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--budget-ms", type=float, default=settings.IMPORT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    best_ms, best_output = None, ""
+    for _ in range(args.runs):
+        elapsed_ms, output = measure(args.module)
+        if best_ms is None or elapsed_ms < best_ms:
+            best_ms, best_output = elapsed_ms, output
+
+    print(f"import {args.module}: {best_ms:.0f} ms (budget {args.budget_ms:.0f} ms, best of {args.runs})")
+    for cumulative_us, name in heaviest_imports(best_output):
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    if best_ms > args.budget_ms:
+        print("FAIL: import time budget exceeded")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,26 +1,131 @@
+import atexit
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+import random
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
+
+from core.config import settings
+
+# Стандартные атрибуты LogRecord - всё остальное пришло через extra и пишется в JSON
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    '''Одна JSON-строка на запись. Поля из extra попадают в объект как есть'''
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            data["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class LazyQueueHandler(QueueHandler):
+    '''
+    QueueHandler с минимальной работой в вызывающем потоке.
+    msg % args подставляется сразу - аргументы (dict, ORM-объекты) могут измениться,
+    пока запись ждёт в очереди. Traceback и JSON собирает поток QueueListener.
+    '''
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    '''
+    Пропускает долю записей уровня INFO и ниже по имени логгера: доля берётся по самому длинному
+    совпавшему префиксу, поэтому "app.integrations" действует и на app.integrations.<провайдер>.
+    Предупреждения и ошибки проходят всегда. Вешается на handler - фильтры логгера на дочерние не действуют
+    '''
+
+    def __init__(self, rates: dict[str, float]) -> None:
+        super().__init__()
+        # Длинные префиксы первыми
+        self.rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def rate_for(self, name: str) -> float:
+        for prefix, rate in self.rates:
+            if name == prefix or name.startswith(prefix + "."):
+                return rate
+        return 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO:
+            return True
+        rate = self.rate_for(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+def parse_sample_rates(value: str) -> dict[str, float]:
+    '''"app.access=0.1,app.integrations=0.5" -> {"app.access": 0.1, ...}'''
+    rates = {}
+    for item in value.split(","):
+        name, _, rate = item.partition("=")
+        if name.strip() and rate.strip():
+            rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+def _stop_listener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
 
 def setup_logging():
+    global _listener
     logger = logging.getLogger("app")
-    logger.setLevel(logging.INFO)
+    logger.setLevel(settings.LOG_LEVEL.upper())
 
-    formatter = logging.Formatter(
-        "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-    )
+    if _listener is not None:
+        return logger
+
+    if settings.LOG_FORMAT == "text":
+        formatter = logging.Formatter(
+            "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+        )
+    else:
+        formatter = JsonFormatter()
 
     file_handler = RotatingFileHandler(
-        "logs/app.log", 
+        "logs/app.log",
         maxBytes=1024 * 1024,  # 1MB
         backupCount=5,
         encoding="utf-8"
     )
     file_handler.setFormatter(formatter)
-    
+
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(formatter)
 
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    # Файл и консоль пишет отдельный поток, в event loop только put в очередь
+    log_queue = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_stop_listener)
+
+    queue_handler = LazyQueueHandler(log_queue)
+    rates = parse_sample_rates(settings.LOG_SAMPLE_RATES)
+    if rates:
+        queue_handler.addFilter(SamplingFilter(rates))
+    logger.addHandler(queue_handler)
 
-    return logger
\ No newline at end of file
+    return logger
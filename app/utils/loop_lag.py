@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+from core.config import settings
+from utils.metrics import registry
+from utils.profiling import collapse_stack
+
+logger = logging.getLogger("app.loop_lag")
+
+loop_lag_seconds = registry.gauge("event_loop_lag_seconds", "Последняя задержка event loop")
+loop_lag_histogram = registry.histogram(
+    "event_loop_lag_duration_seconds", "Задержка event loop",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+loop_blocks = registry.counter(
+    "event_loop_blocked_total", "Блокировки event loop дольше порога по месту вызова", ("call_site",),
+)
+
+# Больше мест вызова в метке не заводим - остальные идут в "other"
+MAX_CALL_SITES = 200
+
+
+def _project_call_site(frame, project_dir: str) -> str:
+    '''Ближайший к листу кадр из кода проекта: "routers/v1/auth_router.py:42 login"'''
+    leaf = frame
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(project_dir) and "site-packages" not in filename:
+            return f"{os.path.relpath(filename, project_dir)}:{frame.f_lineno} {frame.f_code.co_name}"
+        frame = frame.f_back
+    return f"{leaf.f_code.co_filename}:{leaf.f_lineno} {leaf.f_code.co_name}"
+
+
+class LoopLagMonitor:
+    '''
+    Замер задержки event loop: задача спит interval секунд и смотрит, насколько позже проснулась.
+    Задержка - время, когда loop был занят синхронным кодом и не обслуживал запросы.
+
+    Сторожевой поток следит за тем, как давно задача отмечалась. Если loop не отвечает дольше
+    block_threshold, снимается стек потока loop - это и есть блокирующий вызов. Стеки
+    агрегируются по месту вызова в коде проекта (event_loop_blocked_total{call_site}).
+    '''
+
+    def __init__(self, interval: float = 0.05, block_threshold: float = 0.1, project_dir: Optional[str] = None) -> None:
+        # Отмечаться нужно чаще порога, иначе сторож примет сон задачи за блокировку:
+        # интервал ограничен сверху половиной block_threshold
+        self._interval = min(interval, block_threshold / 2)
+        if self._interval < interval:
+            logger.warning(
+                "LOOP_LAG_INTERVAL %.3fs lowered to %.3fs: must be at most half of LOOP_BLOCK_THRESHOLD (%.3fs)",
+                interval, self._interval, block_threshold,
+            )
+        self._block_threshold = block_threshold
+        self._project_dir = project_dir or str(settings.BASE_DIR)
+        self._task: Optional[asyncio.Task] = None
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        # call_site -> {collapsed-стек: количество}
+        self.blocks: dict[str, Counter] = {}
+
+    async def _run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            self._heartbeat = time.monotonic()
+            await asyncio.sleep(self._interval)
+            lag = max(time.perf_counter() - start - self._interval, 0.0)
+            loop_lag_seconds.set(lag)
+            loop_lag_histogram.observe(lag)
+
+    def _watch(self) -> None:
+        captured_heartbeat = None
+        while not self._stop.wait(self._block_threshold / 4):
+            heartbeat = self._heartbeat
+            stalled_for = time.monotonic() - heartbeat - self._interval
+            if stalled_for < self._block_threshold or heartbeat == captured_heartbeat:
+                continue
+            # Одна запись на одну остановку loop
+            captured_heartbeat = heartbeat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is not None:
+                self._record_block(frame, stalled_for)
+
+    def _record_block(self, frame, stalled_for: float) -> None:
+        call_site = _project_call_site(frame, self._project_dir)
+        stack = collapse_stack(frame)
+        with self._lock:
+            if call_site not in self.blocks and len(self.blocks) >= MAX_CALL_SITES:
+                call_site = "other"
+            self.blocks.setdefault(call_site, Counter())[stack] += 1
+        loop_blocks.inc(call_site=call_site)
+        logger.warning("Event loop blocked for %.3fs at %s", stalled_for, call_site)
+
+    def block_report(self, stacks: int = 3) -> list[dict]:
+        '''Места блокировок по убыванию количества, с самыми частыми стеками'''
+        with self._lock:
+            report = [
+                {
+                    "call_site": call_site,
+                    "count": sum(counter.values()),
+                    "stacks": [{"stack": stack, "count": count} for stack, count in counter.most_common(stacks)],
+                }
+                for call_site, counter in self.blocks.items()
+            ]
+        report.sort(key=lambda item: item["count"], reverse=True)
+        return report
+
+    def start(self) -> None:
+        if self._task is None:
+            self._loop_thread_id = threading.get_ident()
+            self._heartbeat = time.monotonic()
+            self._task = asyncio.create_task(self._run())
+            self._stop.clear()
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    async def stop(self) -> None:
+        if self._watchdog is not None:
+            self._stop.set()
+            self._watchdog.join()
+            self._watchdog = None
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+loop_lag_monitor = LoopLagMonitor(
+    interval=settings.LOOP_LAG_INTERVAL,
+    block_threshold=settings.LOOP_BLOCK_THRESHOLD,
+)
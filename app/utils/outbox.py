@@ -0,0 +1,252 @@
+import asyncio
+import logging
+import random
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+from sqlalchemy import event, select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.db import async_session
+from models.OutboxModel import OutboxModel
+from utils.metrics import registry
+
+logger = logging.getLogger("app.outbox")
+
+# Обработчик: async def handler(payload, key) -> ответ (сохраняется в result). Исключение - повтор.
+# key ("outbox-<id>") одинаков во всех попытках - его стоит передавать внешнему API как ключ идемпотентности
+OutboxHandler = Callable[[dict, str], Awaitable[Any]]
+
+outbox_dispatched = registry.counter(
+    "outbox_dispatched_total", "Отправки из outbox по результату", ("endpoint", "outcome"),
+)
+
+
+class UnknownOutboxEndpoint(KeyError):
+    '''Для endpoint не зарегистрирован обработчик'''
+
+
+async def enqueue(session: AsyncSession, endpoint: str, payload: dict) -> OutboxModel:
+    '''
+    Добавляет вызов в outbox в текущей транзакции сессии. Коммитит вызывающий код вместе
+    со своим изменением: либо сохранено и то и другое, либо ничего.
+    '''
+    if endpoint not in outbox_dispatcher.endpoints:
+        raise UnknownOutboxEndpoint(endpoint)
+    message = OutboxModel(endpoint=endpoint, payload=payload)
+    session.add(message)
+    await session.flush()
+    if not session.info.get("outbox_notify"):
+        # Будим воркеры после коммита: раньше строка им не видна
+        session.info["outbox_notify"] = True
+        event.listen(session.sync_session, "after_commit", _notify_after_commit, once=True)
+    return message
+
+
+def _notify_after_commit(sync_session) -> None:
+    sync_session.info.pop("outbox_notify", None)
+    outbox_dispatcher.notify()
+
+
+class OutboxDispatcher:
+    '''
+    Отправка сообщений outbox.
+    Воркер в короткой транзакции захватывает пачку строк (SELECT ... FOR UPDATE SKIP LOCKED ->
+    status='inflight', аренда до available_at) и коммитит. Обработчики вызываются вне транзакции,
+    параллельно; у каждого endpoint свой семафор, чтобы медленный API не занимал все слоты.
+    Результаты пишутся второй короткой транзакцией, только если аренда ещё наша (attempts не изменился).
+    Если процесс упал или вызов не уложился в аренду, строку заберёт другой воркер: доставка
+    at-least-once, обработчик получает постоянный ключ идемпотентности сообщения.
+    После ошибки - повтор с экспоненциальной задержкой и jitter, после max_attempts - статус dead.
+    Dead-сообщения видны в админке и возвращаются в очередь вручную.
+    '''
+
+    def __init__(
+        self,
+        session_factory=async_session,
+        workers: int = 2,
+        batch_size: int = 20,
+        poll_interval: float = 1.0,
+        max_attempts: int = 8,
+        retry_delay: float = 2.0,
+        max_retry_delay: float = 600.0,
+        concurrency: int = 4,
+        lease: float = 300.0,
+    ) -> None:
+        self._session_factory = session_factory
+        self._workers = workers
+        self._batch_size = batch_size
+        self._poll_interval = poll_interval
+        self._max_attempts = max_attempts
+        self._retry_delay = retry_delay
+        self._max_retry_delay = max_retry_delay
+        self._concurrency = concurrency
+        self._lease = lease
+        self._handlers: dict[str, tuple[OutboxHandler, int]] = {}
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @property
+    def endpoints(self) -> Iterable[str]:
+        return self._handlers.keys()
+
+    def register(self, endpoint: str, concurrency: Optional[int] = None):
+        '''Декоратор обработчика endpoint. concurrency - одновременных вызовов во всём процессе'''
+        def decorator(func: OutboxHandler) -> OutboxHandler:
+            self._handlers[endpoint] = (func, concurrency or self._concurrency)
+            return func
+        return decorator
+
+    def notify(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _semaphore(self, endpoint: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(endpoint)
+        if semaphore is None:
+            semaphore = self._semaphores[endpoint] = asyncio.Semaphore(self._handlers[endpoint][1])
+        return semaphore
+
+    def backoff(self, attempts: int) -> float:
+        '''Экспоненциальная задержка с jitter: повторы после общего сбоя API не приходят одной волной'''
+        delay = min(self._max_retry_delay, self._retry_delay * 2 ** (attempts - 1))
+        return random.uniform(delay / 2, delay)
+
+    async def _call(self, message) -> Any:
+        handler = self._handlers.get(message.endpoint)
+        if handler is None:
+            raise UnknownOutboxEndpoint(message.endpoint)
+        async with self._semaphore(message.endpoint):
+            return await handler[0](message.payload, f"outbox-{message.id}")
+
+    async def _claim(self) -> list:
+        '''Захватить пачку: pending, у которых наступил срок, и inflight с истёкшей арендой'''
+        ready = (
+            select(OutboxModel.id)
+            .where(OutboxModel.status.in_(("pending", "inflight")), OutboxModel.available_at <= func.now())
+            .order_by(OutboxModel.id)
+            .limit(self._batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        async with self._session_factory() as session:
+            result = await session.execute(
+                update(OutboxModel)
+                .where(OutboxModel.id.in_(ready.scalar_subquery()))
+                .values(
+                    status="inflight",
+                    attempts=OutboxModel.attempts + 1,
+                    available_at=func.now() + timedelta(seconds=self._lease),
+                )
+                .returning(OutboxModel.id, OutboxModel.endpoint, OutboxModel.payload, OutboxModel.attempts)
+                .execution_options(synchronize_session=False)
+            )
+            messages = sorted(result.all(), key=lambda m: m.id)
+            await session.commit()
+        return messages
+
+    async def process_batch(self) -> int:
+        messages = await self._claim()
+        if not messages:
+            return 0
+        # Внешние вызовы - без открытой транзакции и без занятого соединения пула
+        results = await asyncio.gather(*(self._call(m) for m in messages), return_exceptions=True)
+        async with self._session_factory() as session:
+            for message, outcome in zip(messages, results):
+                result = await session.execute(
+                    update(OutboxModel)
+                    .where(
+                        OutboxModel.id == message.id,
+                        OutboxModel.status == "inflight",
+                        OutboxModel.attempts == message.attempts,
+                    )
+                    .values(**self._outcome_values(message, outcome))
+                    .execution_options(synchronize_session=False)
+                )
+                if not result.rowcount:
+                    logger.warning("Outbox message %s (%s): lease lost, result dropped", message.id, message.endpoint)
+            await session.commit()
+        return len(messages)
+
+    def _outcome_values(self, message, outcome: Any) -> dict:
+        if not isinstance(outcome, BaseException):
+            outbox_dispatched.inc(endpoint=message.endpoint, outcome="ok")
+            return {"status": "done", "result": outcome, "last_error": None, "processed_at": func.now()}
+
+        last_error = f"{type(outcome).__name__}: {outcome}"[:1000]
+        if message.attempts >= self._max_attempts:
+            outbox_dispatched.inc(endpoint=message.endpoint, outcome="dead")
+            logger.error("Outbox message %s (%s) is dead: %s", message.id, message.endpoint, last_error)
+            return {"status": "dead", "last_error": last_error, "processed_at": func.now()}
+
+        delay = self.backoff(message.attempts)
+        outbox_dispatched.inc(endpoint=message.endpoint, outcome="retry")
+        logger.warning("Outbox message %s (%s) retry in %.1fs: %s", message.id, message.endpoint, delay, last_error)
+        return {
+            "status": "pending",
+            "last_error": last_error,
+            "available_at": func.now() + timedelta(seconds=delay),
+        }
+
+    async def dead_letters(self, session: AsyncSession, endpoint: Optional[str] = None, limit: int = 100) -> list[OutboxModel]:
+        stmt = select(OutboxModel).where(OutboxModel.status == "dead")
+        if endpoint is not None:
+            stmt = stmt.where(OutboxModel.endpoint == endpoint)
+        result = await session.execute(stmt.order_by(OutboxModel.id.desc()).limit(limit))
+        return result.scalars().all()
+
+    async def retry(self, session: AsyncSession, ids: Optional[list[int]] = None, endpoint: Optional[str] = None) -> int:
+        '''Вернуть dead-сообщения в очередь с обнулёнными попытками. Без ids - все (или все по endpoint)'''
+        stmt = (
+            update(OutboxModel)
+            .where(OutboxModel.status == "dead")
+            .values(status="pending", attempts=0, available_at=func.now(), processed_at=None)
+        )
+        if ids is not None:
+            stmt = stmt.where(OutboxModel.id.in_(ids))
+        if endpoint is not None:
+            stmt = stmt.where(OutboxModel.endpoint == endpoint)
+        result = await session.execute(stmt)
+        await session.commit()
+        if result.rowcount:
+            self.notify()
+        return result.rowcount
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                processed = await self.process_batch()
+            except Exception:
+                logger.exception("Outbox worker error")
+                processed = 0
+            if processed < self._batch_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self._poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self._workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+outbox_dispatcher = OutboxDispatcher(
+    workers=settings.OUTBOX_WORKERS,
+    batch_size=settings.OUTBOX_BATCH_SIZE,
+    poll_interval=settings.OUTBOX_POLL_INTERVAL,
+    max_attempts=settings.OUTBOX_MAX_ATTEMPTS,
+    retry_delay=settings.OUTBOX_RETRY_DELAY,
+    max_retry_delay=settings.OUTBOX_MAX_RETRY_DELAY,
+    concurrency=settings.OUTBOX_CONCURRENCY,
+    lease=settings.OUTBOX_LEASE,
+)
@@ -0,0 +1,191 @@
+import asyncio
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+from core.config import settings
+
+# Имя файла профиля: только то, что генерирует сам сервис (защита от обхода путей)
+PROFILE_NAME_RE = re.compile(r"^[\w.-]+\.collapsed$")
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    # Короткий путь: внутри проекта - относительный, для библиотек - от site-packages
+    marker = filename.rfind("site-packages")
+    if marker != -1:
+        filename = filename[marker + len("site-packages") + 1:]
+    else:
+        filename = os.path.relpath(filename) if os.path.isabs(filename) else filename
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ":")
+
+
+def collapse_stack(frame, max_depth: int = 128) -> str:
+    '''Стек в формате collapsed (flamegraph.pl, speedscope): корень;...;лист'''
+    labels = []
+    while frame is not None and len(labels) < max_depth:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return ";".join(labels)
+
+
+class StackSampler:
+    '''
+    Сэмплирующий профайлер: отдельный поток раз в interval секунд снимает стеки
+    через sys._current_frames() и считает одинаковые. Профилируемый код не трогается,
+    накладные расходы - только на сам снимок.
+    thread_id - профилировать один поток (event loop), иначе все кроме своего.
+    '''
+
+    def __init__(self, interval: float = 0.01, thread_id: Optional[int] = None) -> None:
+        self.interval = interval
+        self.thread_id = thread_id
+        self.samples: Counter = Counter()
+        self.started_at: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            if self.thread_id is not None:
+                frame = frames.get(self.thread_id)
+                stacks = [collapse_stack(frame)] if frame is not None else []
+            else:
+                stacks = [collapse_stack(frame) for ident, frame in frames.items() if ident != own_id]
+            with self._lock:
+                self.samples.update(stacks)
+
+    def collapsed(self) -> str:
+        with self._lock:
+            items = self.samples.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in items)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.samples.clear()
+        self.started_at = time.time()
+
+
+class ProfileStore:
+    '''Каталог с файлами профилей. Хранится не больше max_files последних'''
+
+    def __init__(self, directory: Path, max_files: int = 50) -> None:
+        self.directory = Path(directory)
+        self.max_files = max_files
+
+    def new_name(self, label: str) -> str:
+        slug = re.sub(r"[^\w.-]+", "_", label).strip("_")[:80]
+        return f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{slug}.collapsed"
+
+    def save(self, name: str, content: str) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / name
+        path.write_text(content, encoding="utf-8")
+        self._cleanup()
+        return path
+
+    def path(self, name: str) -> Optional[Path]:
+        if not PROFILE_NAME_RE.match(name):
+            return None
+        path = self.directory / name
+        return path if path.is_file() else None
+
+    def list(self) -> list[dict]:
+        if not self.directory.is_dir():
+            return []
+        files = sorted(self.directory.glob("*.collapsed"), key=lambda p: p.stat().st_mtime, reverse=True)
+        return [{"name": p.name, "size": p.stat().st_size, "created_at": p.stat().st_mtime} for p in files]
+
+    def _cleanup(self) -> None:
+        files = sorted(self.directory.glob("*.collapsed"), key=lambda p: p.stat().st_mtime)
+        for path in files[:-self.max_files]:
+            path.unlink(missing_ok=True)
+
+
+class ProfilingMiddleware:
+    '''
+    Профиль одного запроса по заголовку X-Profile: 1.
+    Заголовок принимается только с токеном администратора (authorize), иначе игнорируется.
+    Сэмплируется поток event loop, пока идёт запрос - параллельные запросы тоже попадут в профиль.
+    Имя файла отдаётся в X-Profile-File, скачать - /api/v1/admin/profiles/{name}.
+    '''
+
+    def __init__(
+        self,
+        app,
+        store: ProfileStore,
+        authorize: Callable[[str], Awaitable[bool]],
+        interval: float = 0.005,
+    ) -> None:
+        self.app = app
+        self.store = store
+        self.authorize = authorize
+        self.interval = interval
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        token = _bearer_token(headers.get(b"authorization"))
+        if headers.get(b"x-profile") not in (b"1", b"true") or not token or not await self.authorize(token):
+            await self.app(scope, receive, send)
+            return
+
+        name = self.store.new_name(f"{scope['method']}-{scope['path']}")
+        sampler = StackSampler(interval=self.interval, thread_id=threading.get_ident())
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-file", name.encode())]
+            await send(message)
+
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampler.stop()
+            await asyncio.to_thread(self.store.save, name, sampler.collapsed())
+
+
+def _bearer_token(value: Optional[bytes]) -> Optional[str]:
+    if not value:
+        return None
+    scheme, _, token = value.decode("latin-1").partition(" ")
+    return token if scheme.lower() == "bearer" and token else None
+
+
+profile_store = ProfileStore(settings.PROFILE_DIR, max_files=settings.PROFILE_MAX_FILES)
+# Непрерывный профайлер всех потоков, включается из админки
+continuous_profiler = StackSampler(interval=settings.PROFILE_CONTINUOUS_INTERVAL)
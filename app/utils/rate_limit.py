@@ -0,0 +1,100 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy import Float, bindparam, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+class TokenBucketLimiter:
+    '''
+    Token bucket по ключу в памяти процесса.
+    Состояние на ключ - кортеж (tokens, updated_at); самые давние ключи вытесняются по LRU,
+    что безопасно: вытесненный ключ просто начинает с полного ведра.
+    '''
+
+    def __init__(self, capacity: float, refill_per_second: float, max_keys: int = 100000) -> None:
+        self._capacity = capacity
+        self._rate = refill_per_second
+        self._max_keys = max_keys
+        self._buckets: "OrderedDict[str, tuple[float, float]]" = OrderedDict()
+
+    async def acquire(self, key: str, session: Optional[AsyncSession] = None) -> float:
+        '''Списывает токен. Возвращает 0 если можно, иначе сколько секунд ждать'''
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            tokens = self._capacity
+        else:
+            tokens = min(self._capacity, bucket[0] + (now - bucket[1]) * self._rate)
+            self._buckets.move_to_end(key)
+
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now)
+            retry_after = 0.0
+        else:
+            self._buckets[key] = (tokens, now)
+            retry_after = (1 - tokens) / self._rate
+
+        while len(self._buckets) > self._max_keys:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+
+class PostgresTokenBucketLimiter:
+    '''
+    Token bucket с общим состоянием в таблице auth_rate_limits - для нескольких воркеров.
+    Пополнение и списание делаются одним атомарным UPSERT. При отказе строка не меняется,
+    поэтому allowed определяется по тому, сдвинулось ли updated_at.
+    '''
+
+    _UPSERT = text(
+        """
+        INSERT INTO auth_rate_limits AS b (key, tokens, updated_at)
+        VALUES (:key, :capacity - 1, :now)
+        ON CONFLICT (key) DO UPDATE SET
+            tokens = CASE
+                WHEN LEAST(:capacity, b.tokens + (:now - b.updated_at) * :rate) >= 1
+                THEN LEAST(:capacity, b.tokens + (:now - b.updated_at) * :rate) - 1
+                ELSE b.tokens END,
+            updated_at = CASE
+                WHEN LEAST(:capacity, b.tokens + (:now - b.updated_at) * :rate) >= 1
+                THEN :now
+                ELSE b.updated_at END
+        RETURNING tokens, updated_at
+        """
+    ).bindparams(
+        bindparam("capacity", type_=Float),
+        bindparam("rate", type_=Float),
+        bindparam("now", type_=Float),
+    )
+
+    _PRUNE = text("DELETE FROM auth_rate_limits WHERE updated_at < :cutoff").bindparams(
+        bindparam("cutoff", type_=Float)
+    )
+
+    # Как часто чистить полностью восстановившиеся ведра
+    PRUNE_EVERY = 1000
+
+    def __init__(self, capacity: float, refill_per_second: float) -> None:
+        self._capacity = capacity
+        self._rate = refill_per_second
+        self._calls = 0
+
+    async def acquire(self, key: str, session: Optional[AsyncSession] = None) -> float:
+        now = time.time()
+        result = await session.execute(
+            self._UPSERT, {"key": key, "capacity": self._capacity, "rate": self._rate, "now": now}
+        )
+        tokens, updated_at = result.one()
+
+        self._calls += 1
+        if self._calls % self.PRUNE_EVERY == 0:
+            # Ведро, которое успело наполниться, эквивалентно отсутствующему
+            await session.execute(self._PRUNE, {"cutoff": now - self._capacity / self._rate})
+        await session.commit()
+
+        if updated_at == now:
+            return 0.0
+        refilled = min(self._capacity, tokens + (now - updated_at) * self._rate)
+        return (1 - refilled) / self._rate
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from core.config import settings
+from utils.cache import TTLCache
+from utils.uploads import StoredFile, UploadStorage, receipt_storage
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow не установлен - чеки уходят как есть
+    Image = None
+    ImageOps = None
+
+logger = logging.getLogger("app.receipts")
+
+# Что умеем пересжимать. PDF и прочее отправляется без изменений
+NORMALIZABLE_TYPES = ("image/jpeg", "image/png", "image/webp", "image/bmp", "image/tiff")
+
+
+def normalize_image_file(src_path: str, dst_path: str, max_side: int, quality: int) -> bool:
+    '''
+    Выполняется в отдельном процессе. Поворот по EXIF, уменьшение до max_side по большей стороне,
+    JPEG с заданным качеством без метаданных (EXIF, GPS, ICC). False - если результат не меньше исходника.
+    '''
+    with Image.open(src_path) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ("RGBA", "LA", "P"):
+            # Прозрачность в JPEG не поддерживается - подкладываем белый фон
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        image.save(dst_path, "JPEG", quality=quality, optimize=True, progressive=True)
+    if os.path.getsize(dst_path) >= os.path.getsize(src_path):
+        os.remove(dst_path)
+        return False
+    return True
+
+
+class ReceiptNormalizer:
+    '''
+    Предобработка фото чеков перед отправкой провайдеру: уменьшение, пересжатие, удаление метаданных.
+    Pillow работает в пуле процессов и не занимает ни event loop, ни GIL воркера.
+    Результат кэшируется по sha256 исходника (в памяти и маркером на диске),
+    поэтому один и тот же чек обрабатывается один раз, в том числе при параллельной отправке.
+    '''
+
+    def __init__(self, storage: UploadStorage, max_side: int = 1600, quality: int = 80, workers: int = 2) -> None:
+        self.storage = storage
+        self.max_side = max_side
+        self.quality = quality
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._results = TTLCache(maxsize=10000, ttl=24 * 3600)
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return Image is not None
+
+    def _marker_path(self, sha256: str):
+        # В имени параметры обработки: при их смене чеки пересчитаются заново
+        return self.storage.directory / f".norm-{sha256}-{self.max_side}-{self.quality}"
+
+    async def normalize(self, stored: StoredFile) -> StoredFile:
+        if not self.enabled or (stored.content_type or "").lower() not in NORMALIZABLE_TYPES:
+            return stored
+
+        result = self._results.get(stored.sha256)
+        if result is not None and await asyncio.to_thread((self.storage.directory / result.name).is_file):
+            return result
+
+        future = self._inflight.get(stored.sha256)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = self._inflight[stored.sha256] = asyncio.get_running_loop().create_future()
+        result = stored
+        try:
+            result = await self._normalize(stored)
+            self._results.set(stored.sha256, result)
+        except Exception as e:
+            # Не смогли обработать - отправляем оригинал, провайдер решит сам
+            logger.warning("Receipt normalization failed for %s: %s", stored.name, e)
+        finally:
+            self._inflight.pop(stored.sha256, None)
+            future.set_result(result)
+        return result
+
+    async def _normalize(self, stored: StoredFile) -> StoredFile:
+        marker = self._marker_path(stored.sha256)
+        cached = await asyncio.to_thread(self._read_marker, marker, stored)
+        if cached is not None:
+            return cached
+
+        src_path = str(self.storage.directory / stored.name)
+        tmp_path = str(self.storage.directory / f".tmp-{uuid.uuid4().hex}.jpg")
+        loop = asyncio.get_running_loop()
+        try:
+            smaller = await loop.run_in_executor(
+                self._get_executor(), normalize_image_file, src_path, tmp_path, self.max_side, self.quality
+            )
+            if not smaller:
+                result = stored
+            else:
+                result = await asyncio.to_thread(self._store_result, tmp_path, stored)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        await asyncio.to_thread(marker.write_text, result.name, "utf-8")
+        logger.info("Receipt %s normalized: %s -> %s bytes", stored.name, stored.size, result.size)
+        return result
+
+    def _store_result(self, tmp_path: str, stored: StoredFile) -> StoredFile:
+        base_name = os.path.splitext(stored.filename or "receipt")[0]
+        with open(tmp_path, "rb") as file:
+            return self.storage.save_file(file, f"{base_name}.jpg", "image/jpeg")
+
+    def _read_marker(self, marker, stored: StoredFile) -> Optional[StoredFile]:
+        if not marker.is_file():
+            return None
+        name = marker.read_text("utf-8").strip()
+        if name == stored.name:
+            return stored
+        path = self.storage.path(name)
+        if path is None or not path.is_file():
+            return None
+        base_name = os.path.splitext(stored.filename or "receipt")[0]
+        digest = name.split(".", 1)[0]
+        return StoredFile(
+            name=name,
+            sha256=digest,
+            size=path.stat().st_size,
+            content_type="image/jpeg",
+            url=self.storage.url(name),
+            filename=f"{base_name}.jpg",
+        )
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+receipt_normalizer = ReceiptNormalizer(
+    receipt_storage,
+    max_side=settings.RECEIPT_MAX_SIDE,
+    quality=settings.RECEIPT_JPEG_QUALITY,
+    workers=settings.RECEIPT_NORMALIZE_WORKERS,
+)
@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Optional, Union
+
+import httpx
+from fastapi import UploadFile
+
+from core.config import settings
+from utils.receipt_images import ReceiptNormalizer, receipt_normalizer
+from utils.uploads import StoredFile, UploadStorage, receipt_storage
+
+logger = logging.getLogger("app.receipts")
+
+
+class ReceiptForwarder:
+    '''
+    Пересылка чеков провайдерам.
+    Загрузка один раз сохраняется на диск (UploadStorage) и при необходимости нормализуется
+    (ReceiptNormalizer), дальше файл отдаётся провайдеру
+    потоково: httpx читает его кусками при отправке multipart, целиком в памяти он не лежит.
+    Один пул соединений на все провайдеры, число одновременных загрузок ограничено
+    семафором на каждого провайдера.
+    Чеки лежат в закрытом каталоге (не под /uploads). После успешной отправки файл удаляется,
+    если его не использует другая отправка; неотправленные удаляются по истечении spool_ttl.
+    '''
+
+    def __init__(
+        self,
+        storage: UploadStorage,
+        normalizer: Optional[ReceiptNormalizer] = None,
+        concurrency: int = 4,
+        max_connections: int = 20,
+        timeout: float = 60,
+        spool_ttl: float = 24 * 3600,
+    ) -> None:
+        self.storage = storage
+        self.spool_ttl = spool_ttl
+        self.normalizer = normalizer
+        self.concurrency = concurrency
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        # Сколько отправок сейчас используют файл; нормализованный файл -> исходник
+        self._in_use: Counter = Counter()
+        self._sources: dict[str, str] = {}
+        self._last_sweep = 0.0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+            )
+        return self._client
+
+    def _semaphore(self, provider: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(provider)
+        if semaphore is None:
+            semaphore = self._semaphores[provider] = asyncio.Semaphore(self.concurrency)
+        return semaphore
+
+    async def spool(self, receipt: Union[UploadFile, StoredFile]) -> StoredFile:
+        '''
+        UploadFile сохраняется в хранилище, фото чека уменьшается и пересжимается (если включено).
+        Файл считается занятым до release()
+        '''
+        await self._maybe_sweep()
+        if not isinstance(receipt, StoredFile):
+            receipt = await self.storage.save(receipt)
+        self._in_use[receipt.name] += 1
+        stored = receipt
+        if self.normalizer is not None:
+            try:
+                stored = await self.normalizer.normalize(receipt)
+            except BaseException:
+                self._in_use[receipt.name] -= 1
+                raise
+        if stored.name != receipt.name:
+            self._in_use[stored.name] += 1
+            self._sources[stored.name] = receipt.name
+        return stored
+
+    async def release(self, stored: StoredFile, forwarded: bool) -> None:
+        '''Освободить файл после отправки. forwarded - провайдер принял чек, файл больше не нужен'''
+        names = [stored.name]
+        source = self._sources.get(stored.name)
+        if source is not None:
+            names.append(source)
+        removable = []
+        for name in names:
+            self._in_use[name] -= 1
+            if self._in_use[name] <= 0:
+                del self._in_use[name]
+                if name == stored.name:
+                    self._sources.pop(name, None)
+                if forwarded:
+                    removable.append(name)
+        for name in removable:
+            await asyncio.to_thread(self.storage.remove, name)
+
+    async def _maybe_sweep(self) -> None:
+        # Неотправленные чеки удаляются не реже, чем раз в четверть срока хранения
+        now = time.monotonic()
+        if now - self._last_sweep < min(self.spool_ttl / 4, 3600):
+            return
+        self._last_sweep = now
+        removed = await asyncio.to_thread(self.storage.remove_older_than, self.spool_ttl, list(self._in_use))
+        if removed:
+            logger.info("Removed %s expired receipt files", removed)
+
+    async def send(
+        self,
+        provider: str,
+        url: str,
+        field: str,
+        receipt: Union[UploadFile, StoredFile],
+        data: Optional[dict] = None,
+        headers: Optional[dict] = None,
+        method: str = "POST",
+        extra_files: Optional[dict] = None,
+    ) -> Optional[dict]:
+        '''
+        Отправляет чек multipart-запросом. Как и _make_request провайдеров, при ошибке возвращает None.
+        extra_files - прочие части формы, которые провайдер ждёт рядом с чеком
+        '''
+        stored = await self.spool(receipt)
+        forwarded = False
+        try:
+            async with self._semaphore(provider):
+                file = await asyncio.to_thread(stored.open, self.storage)
+                try:
+                    response = await self.client.request(
+                        method,
+                        url,
+                        headers=headers,
+                        data={key: str(value) for key, value in (data or {}).items()},
+                        files={
+                            field: (stored.filename or stored.name, file, stored.content_type or "application/octet-stream"),
+                            **(extra_files or {}),
+                        },
+                    )
+                except httpx.HTTPError as e:
+                    logger.warning("%s receipt upload error: %s", provider, e)
+                    return None
+                finally:
+                    file.close()
+
+            logger.debug("%s receipt upload %s -> %s, response: %s", provider, url, response.status_code, response.text)
+            if response.is_error:
+                logger.warning("%s receipt upload failed: %s %s", provider, response.status_code, response.text)
+                return None
+            forwarded = True
+            try:
+                return response.json()
+            except ValueError:
+                return None
+        finally:
+            await self.release(stored, forwarded)
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+receipt_forwarder = ReceiptForwarder(
+    receipt_storage,
+    normalizer=receipt_normalizer if settings.RECEIPT_NORMALIZE else None,
+    concurrency=settings.RECEIPT_UPLOAD_CONCURRENCY,
+    max_connections=settings.RECEIPT_HTTP_MAX_CONNECTIONS,
+    timeout=settings.RECEIPT_UPLOAD_TIMEOUT,
+    spool_ttl=settings.RECEIPT_SPOOL_TTL,
+)
@@ -0,0 +1,154 @@
+import logging
+import time
+from collections import deque
+
+from utils.metrics import http_request_duration
+
+logger = logging.getLogger("app")
+# Успешные запросы - отдельный логгер, чтобы их можно было сэмплировать (LOG_SAMPLE_RATES)
+access_logger = logging.getLogger("app.access")
+
+# Тела этих типов не логируются: загрузки чеков, файлы
+SKIP_BODY_CONTENT_TYPES = ("multipart/", "application/octet-stream", "image/", "application/pdf")
+
+
+def _content_type(headers) -> str:
+    for name, value in headers:
+        if name.lower() == b"content-type":
+            return value.decode("latin-1").lower()
+    return ""
+
+
+def _route_path(scope) -> str:
+    # Шаблон пути (/api/v1/users/{user_id}), а не сам путь - иначе метки не ограничены.
+    # route.path у вложенных роутеров без префикса, поэтому шаблон собирается из path и path_params
+    if scope.get("route") is None:
+        return "unmatched"
+    path = scope["path"]
+    for name, value in (scope.get("path_params") or {}).items():
+        path = path.replace(f"/{value}", f"/{{{name}}}", 1)
+    return path
+
+
+class BodyCapture:
+    '''Первые limit байт тела. Остальное не копируется, только считается размер'''
+    __slots__ = ("limit", "buffer", "size", "skipped")
+
+    def __init__(self, limit: int, skipped: bool = False) -> None:
+        self.limit = limit
+        self.buffer = bytearray()
+        self.size = 0
+        self.skipped = skipped
+
+    def feed(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        free = self.limit - len(self.buffer)
+        if not self.skipped and free > 0:
+            self.buffer += chunk[:free]
+
+    def text(self) -> str:
+        if self.skipped:
+            return f"<{self.size} байт, не логируется>"
+        text = self.buffer.decode("utf-8", errors="replace")
+        if self.size > len(self.buffer):
+            text += f"... <обрезано, всего {self.size} байт>"
+        return text
+
+
+class RequestLoggingMiddleware:
+    '''
+    Логирование запросов как чистое ASGI-middleware (без BaseHTTPMiddleware).
+    Тела запроса и ответа не буферизуются целиком: в лог попадают только первые
+    body_limit байт, загрузки файлов пропускаются. Последние ошибки с телами хранятся
+    в кольцевом буфере recent_errors.
+    '''
+
+    def __init__(self, app, body_limit: int = 4096, history_size: int = 100) -> None:
+        self.app = app
+        self.body_limit = body_limit
+        self.recent_errors = deque(maxlen=history_size)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        method, path = scope["method"], scope["path"]
+        request_body = BodyCapture(
+            self.body_limit,
+            skipped=_content_type(scope["headers"]).startswith(SKIP_BODY_CONTENT_TYPES),
+        )
+        response_body = BodyCapture(self.body_limit)
+        status_code = None
+
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "http.request":
+                request_body.feed(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message):
+            nonlocal status_code, response_body
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                response_body = BodyCapture(
+                    self.body_limit,
+                    skipped=_content_type(message.get("headers", [])).startswith(SKIP_BODY_CONTENT_TYPES),
+                )
+            elif message["type"] == "http.response.body" and status_code >= 400:
+                # Тело ответа нужно только для логов ошибок
+                response_body.feed(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        except Exception as e:
+            duration = time.perf_counter() - start_time
+            logger.error(
+                "💥 Internal Server Error (500). Method: %s, Path: %s, Duration: %.2fs Error: %s",
+                method, path, duration, e
+            )
+            logger.error("Тело запроса: %s", request_body.text())
+            logger.exception("Full traceback:")
+            self._remember(method, path, 500, duration, request_body, None)
+            http_request_duration.observe(duration, method=method, route=_route_path(scope), status=500)
+
+            if status_code is not None:
+                # Ответ уже начат - отдать 500 нельзя
+                raise
+            await send({
+                "type": "http.response.start",
+                "status": 500,
+                "headers": [(b"content-type", b"application/json")],
+            })
+            await send({"type": "http.response.body", "body": b'{"detail": "Internal Server Error"}'})
+            return
+
+        duration = time.perf_counter() - start_time
+        http_request_duration.observe(duration, method=method, route=_route_path(scope), status=status_code)
+        if status_code is not None and status_code >= 400:
+            logger.error(
+                "⛑️ Ошибка: %s. Метод: %s, Путь: %s, Время: %.2fs",
+                status_code, method, path, duration
+            )
+            logger.error("Тело запроса: %s", request_body.text())
+            logger.error("Тело ответа: %s", response_body.text())
+            self._remember(method, path, status_code, duration, request_body, response_body)
+        else:
+            access_logger.info(
+                "✅ Успех: %s. Метод: %s, Путь: %s, Время: %.2fs",
+                status_code, method, path, duration,
+                extra={"status": status_code, "method": method, "path": path, "duration": round(duration, 4)},
+            )
+
+    def _remember(self, method, path, status_code, duration, request_body, response_body) -> None:
+        self.recent_errors.append({
+            "time": time.time(),
+            "method": method,
+            "path": path,
+            "status": status_code,
+            "duration": round(duration, 4),
+            "request_body": request_body.text(),
+            "response_body": response_body.text() if response_body else None,
+        })
@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import re
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import event
+
+from core.config import settings
+
+logger = logging.getLogger("app.slow_queries")
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_BIND_PARAM = re.compile(r"\$\d+|%\(\w+\)s|(?<!:):\w+|\?")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+# Запросы, для которых план берётся без ANALYZE: ANALYZE их реально выполняет - берёт блокировки строк
+# (живые воркеры с SKIP LOCKED пропустят эти строки) или меняет данные
+_EXPLAINABLE = re.compile(r"^\s*(SELECT|WITH|INSERT|UPDATE|DELETE)\b", re.IGNORECASE)
+_SIDE_EFFECTS = re.compile(
+    r"\bFOR\s+(NO\s+KEY\s+)?UPDATE\b|\bFOR\s+(KEY\s+)?SHARE\b|\bSKIP\s+LOCKED\b|\bNOWAIT\b"
+    r"|\b(nextval|setval|set_config|pg_notify|pg_(try_)?advisory_\w+)\s*\("
+    r"|\b(INSERT|UPDATE|DELETE)\b",
+    re.IGNORECASE,
+)
+
+
+def normalize_sql(statement: str) -> str:
+    '''SQL без литералов и номеров параметров: запросы, отличающиеся только значениями, совпадают'''
+    sql = _STRING_LITERAL.sub("?", statement)
+    sql = _BIND_PARAM.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    sql = _IN_LIST.sub("(...)", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+def explain_prefix(statement: str) -> str:
+    '''EXPLAIN (ANALYZE, BUFFERS) только для чистого чтения, иначе план без выполнения'''
+    if _SIDE_EFFECTS.search(statement):
+        return "EXPLAIN "
+    return "EXPLAIN (ANALYZE, BUFFERS) "
+
+
+def _short_repr(value, limit: int = 500) -> str:
+    text = repr(value)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+class SlowQueryLog:
+    '''
+    Медленные запросы SQLAlchemy (дольше threshold_ms), сгруппированные по нормализованному SQL.
+    Хранится не больше max_entries самых медленных групп. Для SELECT из этой выборки
+    можно снимать EXPLAIN (ANALYZE, BUFFERS) в фоне, на отдельном соединении.
+    '''
+
+    def __init__(
+        self,
+        threshold_ms: float,
+        max_entries: int = 50,
+        explain: bool = False,
+        explain_interval: float = 600,
+        explain_timeout_ms: int = 5000,
+    ) -> None:
+        self.threshold_ms = threshold_ms
+        self.max_entries = max_entries
+        self.explain = explain
+        self.explain_interval = explain_interval
+        self.explain_timeout_ms = explain_timeout_ms
+        self._entries: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._engine = None
+        self._explaining: set[str] = set()
+
+    def install(self, engine) -> None:
+        '''Подписывается на события движка (AsyncEngine или Engine)'''
+        self._engine = engine
+        sync_engine = getattr(engine, "sync_engine", engine)
+        event.listen(sync_engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start_times = conn.info.get("query_start_time")
+        if not start_times:
+            return
+        duration_ms = (time.perf_counter() - start_times.pop()) * 1000
+        if duration_ms < self.threshold_ms or statement.lstrip().upper().startswith("EXPLAIN"):
+            return
+        self.record(statement, parameters, duration_ms, executemany)
+
+    def record(self, statement: str, parameters, duration_ms: float, executemany: bool = False) -> None:
+        sql = normalize_sql(statement)
+        with self._lock:
+            entry = self._entries.get(sql)
+            if entry is None:
+                if len(self._entries) >= self.max_entries:
+                    # Вытесняем самую "быструю" группу, если новый запрос медленнее неё
+                    fastest = min(self._entries, key=lambda key: self._entries[key]["max_ms"])
+                    if self._entries[fastest]["max_ms"] >= duration_ms:
+                        return
+                    del self._entries[fastest]
+                entry = self._entries[sql] = {
+                    "sql": sql,
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "last_ms": 0.0,
+                    "last_seen": 0.0,
+                    "parameters": None,
+                    "statement": statement,
+                    "explain": None,
+                    "explained_at": None,
+                }
+            entry["count"] += 1
+            entry["total_ms"] += duration_ms
+            entry["last_ms"] = duration_ms
+            entry["last_seen"] = time.time()
+            if duration_ms >= entry["max_ms"]:
+                # Для EXPLAIN берём параметры самого медленного выполнения
+                entry["max_ms"] = duration_ms
+                entry["statement"] = statement
+                entry["parameters"] = None if executemany else parameters
+            need_explain = self._need_explain(entry, executemany)
+
+        logger.warning("Slow query %.1f ms: %s params=%s", duration_ms, sql, _short_repr(parameters))
+        if need_explain:
+            self._schedule_explain(sql)
+
+    def _need_explain(self, entry: dict, executemany: bool) -> bool:
+        if not self.explain or self._engine is None or executemany:
+            return False
+        if not _EXPLAINABLE.match(entry["statement"]):
+            return False
+        if entry["sql"] in self._explaining:
+            return False
+        explained_at = entry["explained_at"]
+        return explained_at is None or time.time() - explained_at > self.explain_interval
+
+    def _schedule_explain(self, sql: str) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._explaining.add(sql)
+        loop.create_task(self._explain(sql))
+
+    async def _explain(self, sql: str) -> None:
+        entry = self._entries.get(sql)
+        try:
+            if entry is None:
+                return
+            async with self._engine.connect() as conn:
+                await conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(self.explain_timeout_ms)}")
+                result = await conn.exec_driver_sql(
+                    explain_prefix(entry["statement"]) + entry["statement"],
+                    entry["parameters"] if entry["parameters"] is not None else (),
+                )
+                plan = "\n".join(row[0] for row in result)
+                await conn.rollback()
+            with self._lock:
+                entry["explain"] = plan
+                entry["explained_at"] = time.time()
+        except Exception as e:
+            if entry is not None:
+                entry["explained_at"] = time.time()
+            logger.warning("EXPLAIN failed for %s: %s", sql, e)
+        finally:
+            self._explaining.discard(sql)
+
+    def snapshot(self, limit: Optional[int] = None) -> list[dict]:
+        '''Группы по убыванию max_ms, без исходного statement (он есть в нормализованном виде)'''
+        with self._lock:
+            entries = [
+                {
+                    key: value for key, value in entry.items() if key != "statement"
+                } | {
+                    "avg_ms": round(entry["total_ms"] / entry["count"], 2),
+                    "parameters": _short_repr(entry["parameters"]),
+                }
+                for entry in self._entries.values()
+            ]
+        entries.sort(key=lambda item: item["max_ms"], reverse=True)
+        return entries[:limit] if limit else entries
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+slow_query_log = SlowQueryLog(
+    threshold_ms=settings.SLOW_QUERY_THRESHOLD_MS,
+    max_entries=settings.SLOW_QUERY_MAX_ENTRIES,
+    explain=settings.SLOW_QUERY_EXPLAIN,
+    explain_interval=settings.SLOW_QUERY_EXPLAIN_INTERVAL,
+)
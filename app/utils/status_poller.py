@@ -0,0 +1,293 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Optional
+
+from core.config import settings
+from core.db import async_session
+from utils.rate_limit import TokenBucketLimiter
+from utils.webhooks import ingest_event, webhook_workers
+
+logger = logging.getLogger("app.status_poller")
+
+# Проверка одного ордера: order_id -> (статус, сырой ответ) или None, если ответ не получен
+SingleCheck = Callable[[str], Optional[tuple[str, Any]]]
+# Проверка пачкой через list/history эндпоинт: ([order_id], возраст старейшего ордера в секундах) ->
+# {order_id: (статус, сырой ответ)}. Возраст сужает окно истории до периода, где могут быть ордера пачки
+BatchCheck = Callable[[list[str], float], dict[str, tuple[str, Any]]]
+
+
+def parse_poll_schedule(value: str) -> list[tuple[float, float]]:
+    '''"600:10,3600:60" -> [(600, 10), (3600, 60)]: ордер моложе 600с опрашивается раз в 10с и т.д.'''
+    schedule = []
+    for item in value.split(","):
+        age, _, interval = item.partition(":")
+        if age.strip() and interval.strip():
+            schedule.append((float(age), float(interval)))
+    return sorted(schedule)
+
+
+@dataclass
+class PolledOrder:
+    provider: str
+    order_id: str
+    created_at: float = field(default_factory=time.monotonic)
+    status: Optional[str] = None
+    # Сколько полных оборотов колеса осталось до срабатывания
+    rounds: int = 0
+
+
+@dataclass
+class ProviderPolling:
+    terminal: frozenset
+    limiter: TokenBucketLimiter
+    check: Optional[SingleCheck] = None
+    check_batch: Optional[BatchCheck] = None
+    batch_size: int = 100
+
+
+class StatusPoller:
+    '''
+    Опрос статусов ордеров, по которым провайдер ещё не прислал финальный колбэк.
+    Расписание - хешированное колесо таймеров: slots ячеек по tick секунд, ордер лежит в ячейке
+    своего следующего опроса, поэтому тик стоит O(ордеров в ячейке), а не O(всех ордеров).
+    Интервал растёт с возрастом ордера (schedule), после последней границы ордер снимается с опроса.
+    Проверки идут в потоках, у каждого провайдера свой token bucket; если бюджет исчерпан,
+    ордер переносится на следующий тик. Провайдеры с list/history эндпоинтом опрашиваются пачкой.
+    Результаты попадают в очередь webhook_events (source="poll") и обрабатываются как колбэки.
+    '''
+
+    def __init__(
+        self,
+        schedule: list[tuple[float, float]],
+        tick: float = 1.0,
+        slots: int = 512,
+        rate: float = 2.0,
+        burst: float = 5.0,
+        session_factory=async_session,
+    ) -> None:
+        self._schedule = schedule
+        self._tick = tick
+        self._wheel: list[dict[tuple[str, str], PolledOrder]] = [{} for _ in range(slots)]
+        self._cursor = 0
+        self._rate = rate
+        self._burst = burst
+        self._session_factory = session_factory
+        self._providers: dict[str, ProviderPolling] = {}
+        self._tracked: dict[tuple[str, str], int] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._started_at = time.monotonic()
+
+    def register(
+        self,
+        provider: str,
+        terminal: Iterable[str],
+        check: Optional[SingleCheck] = None,
+        check_batch: Optional[BatchCheck] = None,
+        batch_size: int = 100,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None,
+    ) -> None:
+        limiter = TokenBucketLimiter(burst or self._burst, rate or self._rate)
+        self._providers[provider] = ProviderPolling(frozenset(terminal), limiter, check, check_batch, batch_size)
+
+    def _interval(self, age: float) -> Optional[float]:
+        for age_limit, interval in self._schedule:
+            if age < age_limit:
+                return interval
+        return None
+
+    def _schedule_in(self, order: PolledOrder, delay: float) -> None:
+        ticks = max(1, int(delay / self._tick))
+        slots = len(self._wheel)
+        slot = (self._cursor + ticks) % slots
+        order.rounds = (ticks - 1) // slots
+        self._wheel[slot][(order.provider, order.order_id)] = order
+        self._tracked[(order.provider, order.order_id)] = slot
+
+    def _reschedule(self, order: PolledOrder) -> None:
+        interval = self._interval(time.monotonic() - order.created_at)
+        if interval is None:
+            logger.info("Stop polling %s order %s: too old, last status %s", order.provider, order.order_id, order.status)
+            return
+        self._schedule_in(order, interval)
+
+    def track(self, provider: str, order_id: Any) -> None:
+        '''Поставить ордер на опрос. Вызывается после создания ордера у провайдера; без запущенного опроса - ничего'''
+        if self._task is None or provider not in self._providers or order_id in (None, "", 0):
+            return
+        key = (provider, str(order_id))
+        if key in self._tracked:
+            return
+        self._schedule_in(PolledOrder(provider, str(order_id)), self._schedule[0][1] if self._schedule else self._tick)
+
+    def untrack(self, provider: str, order_id: Any) -> None:
+        '''Снять ордер с опроса, например после финального колбэка'''
+        slot = self._tracked.pop((provider, str(order_id)), None)
+        if slot is not None:
+            self._wheel[slot].pop((provider, str(order_id)), None)
+
+    @property
+    def tracked(self) -> int:
+        return len(self._tracked)
+
+    def _advance(self) -> list[PolledOrder]:
+        '''Сдвинуть курсор на один тик и забрать ордера, чей срок наступил'''
+        self._cursor = (self._cursor + 1) % len(self._wheel)
+        bucket = self._wheel[self._cursor]
+        due = []
+        for key, order in list(bucket.items()):
+            if order.rounds > 0:
+                order.rounds -= 1
+                continue
+            del bucket[key]
+            self._tracked.pop(key, None)
+            due.append(order)
+        return due
+
+    async def poll_due(self, due: list[PolledOrder]) -> None:
+        by_provider: dict[str, list[PolledOrder]] = {}
+        for order in due:
+            by_provider.setdefault(order.provider, []).append(order)
+        await asyncio.gather(*(self._poll_provider(name, orders) for name, orders in by_provider.items()))
+
+    async def _poll_provider(self, provider: str, orders: list[PolledOrder]) -> None:
+        polling = self._providers[provider]
+        results: dict[str, tuple[str, Any]] = {}
+        deferred: list[PolledOrder] = []
+        checked: list[PolledOrder] = []
+
+        if polling.check_batch is not None:
+            for start in range(0, len(orders), polling.batch_size):
+                chunk = orders[start:start + polling.batch_size]
+                if await polling.limiter.acquire(provider) > 0:
+                    deferred.extend(orders[start:])
+                    break
+                max_age = time.monotonic() - min(o.created_at for o in chunk)
+                try:
+                    results.update(await asyncio.to_thread(polling.check_batch, [o.order_id for o in chunk], max_age))
+                except Exception as e:
+                    logger.warning("Batch status check failed for %s: %s", provider, e)
+                checked.extend(chunk)
+        else:
+            for index, order in enumerate(orders):
+                if await polling.limiter.acquire(provider) > 0:
+                    deferred.extend(orders[index:])
+                    break
+                try:
+                    result = await asyncio.to_thread(polling.check, order.order_id)
+                except Exception as e:
+                    logger.warning("Status check failed for %s order %s: %s", provider, order.order_id, e)
+                    result = None
+                if result is not None:
+                    results[order.order_id] = result
+                checked.append(order)
+
+        for order in deferred:
+            # Бюджет провайдера исчерпан - пробуем на следующем тике, не сдвигая возраст
+            self._schedule_in(order, self._tick)
+
+        changed = []
+        for order in checked:
+            result = results.get(order.order_id)
+            if result is not None and result[0] != order.status:
+                order.status = result[0]
+                changed.append((order, result[1]))
+            if order.status not in polling.terminal:
+                self._reschedule(order)
+
+        if changed and not webhook_workers.handles(provider):
+            logger.debug("Skip %s poll results: no webhook handler", provider)
+        elif changed:
+            async with self._session_factory() as session:
+                for order, payload in changed:
+                    await ingest_event(session, provider, order.order_id, order.status, payload, source="poll")
+
+    async def _run(self) -> None:
+        self._started_at = time.monotonic()
+        elapsed_ticks = 0
+        while True:
+            # Если тик обрабатывался дольше tick, догоняем пропущенные ячейки
+            target = int((time.monotonic() - self._started_at) / self._tick)
+            due = []
+            while elapsed_ticks < target:
+                due.extend(self._advance())
+                elapsed_ticks += 1
+            if due:
+                try:
+                    await self.poll_due(due)
+                except Exception:
+                    logger.exception("Status poller error")
+            await asyncio.sleep(self._tick - (time.monotonic() - self._started_at) % self._tick)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+status_poller = StatusPoller(
+    parse_poll_schedule(settings.STATUS_POLL_SCHEDULE),
+    tick=settings.STATUS_POLL_TICK,
+    rate=settings.STATUS_POLL_RATE,
+    burst=settings.STATUS_POLL_BURST,
+)
+
+
+# Запас к возрасту ордера: часы провайдера и момент создания инвойса расходятся с нашими
+_PAYPORT_HISTORY_MARGIN = 300
+
+
+def _payport_check_batch(order_ids: list[str], max_age: float) -> dict[str, tuple[str, Any]]:
+    '''
+    Финальные статусы из истории инвойсов. Окно - от создания старейшего ордера пачки, а не 30 дней,
+    поэтому для молодых ордеров ответ маленький. История читается постранично, пока не найдены все
+    ордера, страница не пуста и не повторяет уже виденные инвойсы (API без пагинации), но не больше
+    STATUS_POLL_MAX_PAGES страниц на статус.
+    '''
+    from integrations.registry import providers
+
+    service = providers.get("payport")
+    to_date = int(time.time() * 1000)
+    from_date = to_date - int((max_age + _PAYPORT_HISTORY_MARGIN) * 1000)
+    wanted = set(order_ids)
+    results = {}
+    for status in (1, -1):
+        seen: set[str] = set()
+        for page in range(1, settings.STATUS_POLL_MAX_PAGES + 1):
+            if wanted.issubset(results):
+                return results
+            response = service.payment_history(status=status, from_date=from_date, to_date=to_date, page=page) or {}
+            invoices = response.get("data") or []
+            page_ids = set()
+            for invoice in invoices if isinstance(invoices, list) else []:
+                invoice_id = str(invoice.get("invoice_id", ""))
+                page_ids.add(invoice_id)
+                if invoice_id in wanted:
+                    results[invoice_id] = (str(status), invoice)
+            if not page_ids or page_ids <= seen:
+                break
+            seen |= page_ids
+        else:
+            logger.warning("Payport history for status %s exceeded %s pages", status, settings.STATUS_POLL_MAX_PAGES)
+    return results
+
+
+def _platipay_check(order_id: str) -> Optional[tuple[str, Any]]:
+    from integrations.registry import providers
+
+    info = providers.get("platipay").details_order(order_id, "deposit", timeout=settings.STATUS_POLL_TIMEOUT)
+    return info.status, info.model_dump()
+
+
+status_poller.register("payport", terminal={"1", "-1"}, check_batch=_payport_check_batch)
+status_poller.register("platipay", terminal={"success", "completed", "canceled", "cancelled", "failed", "expired"}, check=_platipay_check)
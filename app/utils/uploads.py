@@ -0,0 +1,158 @@
+import asyncio
+import hashlib
+import os
+import re
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterable, Optional
+
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from core.config import settings
+
+# Имя файла в хранилище: sha256 содержимого + расширение
+HASHED_NAME_RE = re.compile(r"^([0-9a-f]{64})(\.[a-z0-9]{1,10})?$")
+_EXTENSION_RE = re.compile(r"^\.[a-z0-9]{1,10}$")
+
+# Содержимое по такому URL никогда не меняется - браузер и прокси могут не перепроверять
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Файлы с произвольными именами могут быть заменены на месте - кэш обязан перепроверять (ETag/Last-Modified)
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+
+@dataclass(frozen=True)
+class StoredFile:
+    name: str
+    sha256: str
+    size: int
+    content_type: Optional[str]
+    url: str
+    # Исходное имя файла у клиента - провайдерам отправляется оно
+    filename: Optional[str] = None
+
+    def open(self, storage: "UploadStorage") -> BinaryIO:
+        return open(storage.directory / self.name, "rb")
+
+
+class UploadStorage:
+    '''
+    Загрузки с именами по хешу содержимого (content-addressed).
+    Файл пишется потоково во временный файл с подсчётом sha256 и атомарно переименовывается.
+    Одинаковые файлы хранятся один раз, а URL не меняется, пока не меняется содержимое.
+    '''
+
+    def __init__(self, directory: Path, url_prefix: str = "/uploads", chunk_size: int = 1024 * 1024) -> None:
+        self.directory = Path(directory)
+        self.url_prefix = url_prefix.rstrip("/")
+        self.chunk_size = chunk_size
+
+    def url(self, name: str) -> str:
+        return f"{self.url_prefix}/{name}"
+
+    def path(self, name: str) -> Optional[Path]:
+        if not HASHED_NAME_RE.match(name):
+            return None
+        return self.directory / name
+
+    async def save(self, upload: UploadFile) -> StoredFile:
+        '''Сохраняет UploadFile. Чтение и запись идут в потоке, event loop не блокируется'''
+        await upload.seek(0)
+        return await asyncio.to_thread(self.save_file, upload.file, upload.filename, upload.content_type)
+
+    def save_file(self, file: BinaryIO, filename: Optional[str] = None, content_type: Optional[str] = None) -> StoredFile:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        tmp_path = self.directory / f".tmp-{uuid.uuid4().hex}"
+        try:
+            with open(tmp_path, "wb") as out:
+                while chunk := file.read(self.chunk_size):
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+            name = digest.hexdigest() + _extension(filename)
+            target = self.directory / name
+            if target.exists():
+                # Такой файл уже есть - дубликат не храним, срок хранения отсчитывается заново
+                tmp_path.unlink()
+                os.utime(target)
+            else:
+                os.replace(tmp_path, target)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        return StoredFile(
+            name=name,
+            sha256=digest.hexdigest(),
+            size=size,
+            content_type=content_type,
+            url=self.url(name),
+            filename=filename,
+        )
+
+
+    def remove(self, name: str) -> None:
+        path = self.path(name)
+        if path is not None:
+            path.unlink(missing_ok=True)
+
+    def remove_older_than(self, max_age: float, keep: Iterable[str] = ()) -> int:
+        '''Удаляет файлы (и служебные .tmp/.norm) старше max_age секунд, кроме keep. Возвращает количество'''
+        if not self.directory.is_dir():
+            return 0
+        cutoff = time.time() - max_age
+        keep = set(keep)
+        removed = 0
+        for entry in os.scandir(self.directory):
+            if entry.name in keep or not entry.is_file():
+                continue
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+
+def _extension(filename: Optional[str]) -> str:
+    suffix = Path(filename or "").suffix.lower()
+    return suffix if _EXTENSION_RE.match(suffix) else ""
+
+
+class ImmutableStaticFiles(StaticFiles):
+    '''
+    StaticFiles для хранилища загрузок. Файлам с именем по хешу отдаются
+    Cache-Control: immutable и сильный ETag, равный хешу, - повторный показ чека
+    не читает файл вовсе, а If-None-Match отвечает 304 без обращения к диску за содержимым.
+    Range и zero-copy (расширение ASGI http.response.pathsend) обрабатывает FileResponse Starlette.
+    Старые файлы с произвольными именами отдаются с Cache-Control: no-cache - их могут заменить
+    на месте, поэтому кэш перепроверяет их по ETag/Last-Modified.
+    '''
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        match = HASHED_NAME_RE.match(os.path.basename(full_path))
+        if match is None:
+            response = super().file_response(full_path, stat_result, scope, status_code)
+            response.headers["cache-control"] = REVALIDATE_CACHE_CONTROL
+            return response
+
+        response = FileResponse(
+            full_path,
+            status_code=status_code,
+            stat_result=stat_result,
+            headers={"cache-control": IMMUTABLE_CACHE_CONTROL, "etag": f'"{match.group(1)}"'},
+        )
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+upload_storage = UploadStorage(settings.BASE_DIR / "uploads")
+# Чеки клиентов: каталог вне статики, файлы удаляются после отправки провайдеру или по RECEIPT_SPOOL_TTL
+receipt_storage = UploadStorage(settings.RECEIPT_SPOOL_DIR, url_prefix="")
@@ -0,0 +1,370 @@
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import logging
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Mapping, Optional
+
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.db import async_session
+from models.WebhookEventModel import WebhookEventModel, WebhookPaymentStateModel
+from utils.cache import TTLCache
+
+logger = logging.getLogger("app.webhooks")
+
+WebhookHandler = Callable[[AsyncSession, WebhookEventModel], Awaitable[None]]
+
+
+class WebhookPayloadError(ValueError):
+    '''Колбэк не прошёл проверку - в очередь не попадает'''
+
+
+class WebhookAuthError(Exception):
+    '''Отправитель колбэка не подтверждён: status_code 401 (подпись, секрет) или 403 (IP, не настроено)'''
+
+    def __init__(self, status_code: int, detail: str) -> None:
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _parse_onepayment(payload: Any) -> tuple[Optional[str], Optional[str]]:
+    from integrations.onepayment.OnePaymentService import CallbackPayload
+
+    callback = CallbackPayload.model_validate(payload)
+    return callback.data.attributes.uuid, callback.data.attributes.payment_status
+
+
+def _fields_parser(id_keys: tuple[str, ...], status_keys: tuple[str, ...] = ("status",)):
+    '''Парсер для провайдеров без схемы колбэка: ID и статус по первому найденному ключу'''
+    def parse(payload: Any) -> tuple[Optional[str], Optional[str]]:
+        if not isinstance(payload, dict):
+            raise WebhookPayloadError("Payload must be a JSON object")
+        external_id = next((payload[key] for key in id_keys if payload.get(key) is not None), None)
+        event_status = next((payload[key] for key in status_keys if payload.get(key) is not None), None)
+        return external_id, event_status
+    return parse
+
+
+WEBHOOK_PARSERS: dict[str, Callable[[Any], tuple[Optional[str], Optional[str]]]] = {
+    "onepayment": _parse_onepayment,
+    "payport": _fields_parser(("invoice_id",)),
+    "paybridge": _fields_parser(("transactionId", "transaction_id", "order_id")),
+    "paychain": _fields_parser(("id",)),
+    "sharkpay": _fields_parser(("id", "payment_id")),
+    "bitconce": _fields_parser(("order_id", "custom_id", "id")),
+    "profiat": _fields_parser(("id", "payment_id")),
+}
+
+
+# Порядок статусов платежа. Событие применяется, только если двигает платёж вперёд:
+# повтор или опоздавший confirming после completed пропускаются. Финальные статусы равны друг другу
+STATUS_RANKS: dict[str, dict[str, int]] = {
+    "onepayment": {
+        "processer_search": 0,
+        "transferring": 1,
+        "confirming": 2,
+        "completed": 3,
+        "cancelled": 3,
+    },
+}
+
+
+def is_forward_transition(provider: str, current: Optional[str], new: Optional[str]) -> bool:
+    ranks = STATUS_RANKS.get(provider)
+    if ranks is None or current is None:
+        # Жизненный цикл провайдера неизвестен - применяем всё, но по одному событию на платёж
+        return True
+    if new not in ranks or current not in ranks:
+        return new != current
+    return ranks[new] > ranks[current]
+
+
+def parse_webhook(provider: str, payload: Any) -> tuple[str, Optional[str]]:
+    parser = WEBHOOK_PARSERS.get(provider)
+    if parser is None:
+        raise KeyError(provider)
+    try:
+        external_id, event_status = parser(payload)
+    except WebhookPayloadError:
+        raise
+    except Exception as e:
+        raise WebhookPayloadError(str(e))
+    if external_id is None or external_id == "":
+        raise WebhookPayloadError("Payment id not found in payload")
+    return str(external_id), None if event_status is None else str(event_status)
+
+
+def parse_webhook_secrets(value: str) -> dict[str, str]:
+    '''"payport=s1,paychain=s2" -> {"payport": "s1", "paychain": "s2"}'''
+    secrets = {}
+    for item in value.split(","):
+        provider, _, secret = item.partition("=")
+        if provider.strip() and secret.strip():
+            secrets[provider.strip()] = secret.strip()
+    return secrets
+
+
+def parse_webhook_networks(value: str) -> dict[str, list]:
+    '''"payport=1.2.3.4|10.0.0.0/24" -> {"payport": [IPv4Network("1.2.3.4/32"), IPv4Network("10.0.0.0/24")]}'''
+    networks = {}
+    for item in value.split(","):
+        provider, _, addresses = item.partition("=")
+        if provider.strip() and addresses.strip():
+            networks[provider.strip()] = [
+                ipaddress.ip_network(address.strip(), strict=False) for address in addresses.split("|") if address.strip()
+            ]
+    return networks
+
+
+_webhook_secrets = parse_webhook_secrets(settings.WEBHOOK_SECRETS)
+_webhook_networks = parse_webhook_networks(settings.WEBHOOK_ALLOWED_IPS)
+
+
+def _signature_matches(secret: str, body: bytes, signature: str) -> bool:
+    # Алгоритм по длине hex-подписи: 64 - SHA256, 128 - SHA512 (как подписывают PlatiPays и Euphoria)
+    digest = {64: hashlib.sha256, 128: hashlib.sha512}.get(len(signature))
+    if digest is None:
+        return False
+    expected = hmac.new(secret.encode(), body, digest).hexdigest()
+    return hmac.compare_digest(expected, signature.lower())
+
+
+def verify_webhook(
+    provider: str,
+    body: bytes,
+    headers: Mapping[str, str],
+    query: Mapping[str, str],
+    client_ip: Optional[str],
+) -> None:
+    '''
+    Проверка отправителя до разбора и INSERT. Провайдер без секрета и без списка IP не принимается:
+    иначе поддельный финальный статус займёт ключ дедупликации и настоящий колбэк уйдёт в дубликаты.
+    '''
+    secret = _webhook_secrets.get(provider)
+    networks = _webhook_networks.get(provider)
+    if secret is None and networks is None:
+        raise WebhookAuthError(403, "Webhook sender verification is not configured")
+
+    if networks is not None:
+        try:
+            address = ipaddress.ip_address(client_ip or "")
+        except ValueError:
+            address = None
+        if address is None or not any(address in network for network in networks):
+            raise WebhookAuthError(403, "Sender address is not allowed")
+
+    if secret is not None:
+        signature = headers.get("x-signature") or headers.get("signature")
+        if signature:
+            verified = _signature_matches(secret, body, signature.strip())
+        else:
+            token = headers.get("x-webhook-token") or query.get("token")
+            verified = bool(token) and hmac.compare_digest(token.encode(), secret.encode())
+        if not verified:
+            raise WebhookAuthError(401, "Invalid webhook signature")
+
+
+# Недавно принятые ключи. Уникальный индекс в БД остаётся источником истины
+_recent_keys = TTLCache(maxsize=settings.WEBHOOK_DEDUP_CACHE_SIZE, ttl=settings.WEBHOOK_DEDUP_CACHE_TTL)
+
+
+async def ingest_webhook(session: AsyncSession, provider: str, payload: Any) -> Optional[int]:
+    '''
+    Проверяет колбэк и сохраняет его одним INSERT. Обработка - в WebhookWorkers.
+    Возвращает None для дубликата: тот же статус того же платежа уже принят.
+    '''
+    external_id, event_status = parse_webhook(provider, payload)
+    return await ingest_event(session, provider, external_id, event_status, payload)
+
+
+async def ingest_event(
+    session: AsyncSession,
+    provider: str,
+    external_id: str,
+    event_status: Optional[str],
+    payload: Any,
+    source: str = "callback",
+) -> Optional[int]:
+    '''Общий вход очереди для колбэков и опроса статусов (source="poll")'''
+    key = (provider, external_id, event_status)
+    if _recent_keys.get(key) is not None:
+        return None
+    result = await session.execute(
+        insert(WebhookEventModel)
+        .values(
+            provider=provider,
+            external_id=external_id,
+            event_status=event_status,
+            payload=payload,
+            source=source,
+        )
+        .on_conflict_do_nothing(constraint="uq_webhook_events_dedup")
+        .returning(WebhookEventModel.id)
+    )
+    event_id = result.scalar_one_or_none()
+    await session.commit()
+    _recent_keys.set(key, True)
+    if event_id is not None:
+        webhook_workers.notify()
+    return event_id
+
+
+class WebhookWorkers:
+    '''
+    Фоновая обработка webhook_events.
+    Воркер забирает пачку pending-строк через SELECT ... FOR UPDATE SKIP LOCKED, поэтому
+    несколько воркеров и процессов не берут одну строку дважды и не ждут друг друга.
+    Забираются только события провайдеров с зарегистрированным обработчиком, остальные ждут в pending.
+    Каждое событие обрабатывается в своём SAVEPOINT: ошибка одного не откатывает пачку.
+    События одного платежа сериализуются блокировкой его строки в webhook_payment_states,
+    а статус, не двигающий платёж вперёд, помечается skipped без вызова обработчика.
+    После ошибки событие откладывается с экспоненциальной задержкой, после max_attempts - failed.
+    '''
+
+    def __init__(
+        self,
+        session_factory=async_session,
+        workers: int = 2,
+        batch_size: int = 20,
+        poll_interval: float = 1.0,
+        max_attempts: int = 5,
+        retry_delay: float = 5.0,
+    ) -> None:
+        self._session_factory = session_factory
+        self._workers = workers
+        self._batch_size = batch_size
+        self._poll_interval = poll_interval
+        self._max_attempts = max_attempts
+        self._retry_delay = retry_delay
+        self._handlers: dict[str, WebhookHandler] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def register(self, provider: str):
+        '''Декоратор обработчика событий провайдера: async def handler(session, event)'''
+        def decorator(func: WebhookHandler) -> WebhookHandler:
+            self._handlers[provider] = func
+            return func
+        return decorator
+
+    def handles(self, provider: str) -> bool:
+        '''События провайдера будут обработаны: воркеры запущены и обработчик зарегистрирован'''
+        return bool(self._tasks) and provider in self._handlers
+
+    def notify(self) -> None:
+        '''Разбудить воркеры этого процесса сразу после INSERT, не дожидаясь poll_interval'''
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def process_batch(self) -> int:
+        if not self._handlers:
+            return 0
+        async with self._session_factory() as session:
+            result = await session.execute(
+                select(WebhookEventModel)
+                .where(
+                    WebhookEventModel.status == "pending",
+                    WebhookEventModel.available_at <= func.now(),
+                    WebhookEventModel.provider.in_(list(self._handlers)),
+                )
+                .order_by(WebhookEventModel.id)
+                .limit(self._batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            # Блокировки состояний платежей берутся в одном порядке во всех воркерах - без дедлоков
+            events = sorted(result.scalars().all(), key=lambda e: (e.provider, e.external_id or "", e.id))
+            for event in events:
+                await self._process(session, event)
+            await session.commit()
+            return len(events)
+
+    async def _process(self, session: AsyncSession, event: WebhookEventModel) -> None:
+        handler = self._handlers[event.provider]
+        event.attempts += 1
+        try:
+            async with session.begin_nested():
+                state = await self._lock_state(session, event)
+                if state is not None and not is_forward_transition(event.provider, state.status, event.event_status):
+                    event.status = "skipped"
+                    event.processed_at = func.now()
+                    return
+                await handler(session, event)
+                if state is not None:
+                    state.status = event.event_status
+                    state.event_id = event.id
+        except Exception as e:
+            event.last_error = str(e)[:1000]
+            if event.attempts >= self._max_attempts:
+                event.status = "failed"
+                logger.error("Webhook event %s (%s) failed: %s", event.id, event.provider, e)
+            else:
+                delay = self._retry_delay * 2 ** (event.attempts - 1)
+                event.available_at = func.now() + timedelta(seconds=delay)
+                logger.warning("Webhook event %s (%s) retry in %ss: %s", event.id, event.provider, delay, e)
+        else:
+            event.status = "done"
+            event.processed_at = func.now()
+
+    async def _lock_state(self, session: AsyncSession, event: WebhookEventModel) -> Optional[WebhookPaymentStateModel]:
+        '''Строка состояния платежа под FOR UPDATE: второй воркер с событием того же платежа ждёт'''
+        if event.external_id is None:
+            return None
+        await session.execute(
+            insert(WebhookPaymentStateModel)
+            .values(provider=event.provider, external_id=event.external_id)
+            .on_conflict_do_nothing()
+        )
+        result = await session.execute(
+            select(WebhookPaymentStateModel)
+            .where(
+                WebhookPaymentStateModel.provider == event.provider,
+                WebhookPaymentStateModel.external_id == event.external_id,
+            )
+            .with_for_update()
+        )
+        return result.scalar_one()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                processed = await self.process_batch()
+            except Exception:
+                logger.exception("Webhook worker error")
+                processed = 0
+            if processed < self._batch_size:
+                # Очередь разобрана - ждём новый INSERT или следующий опрос
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self._poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        if not self._handlers:
+            logger.warning("Webhook workers not started: no handlers registered, events stay pending")
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self._workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+webhook_workers = WebhookWorkers(
+    workers=settings.WEBHOOK_WORKERS,
+    batch_size=settings.WEBHOOK_BATCH_SIZE,
+    poll_interval=settings.WEBHOOK_POLL_INTERVAL,
+    max_attempts=settings.WEBHOOK_MAX_ATTEMPTS,
+)
+